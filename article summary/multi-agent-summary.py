@@ -14,12 +14,16 @@ class SummaryState(TypedDict):
     pdf_path: str
     output_path: str
     pdf_text: str
+    chunks: list[str]
+    reference: str
+    chunked: bool
     summary: str
     questions: str
     answers: str
     feedback: str
     evaluation_complete: bool
     iteration_count: int
+    max_iterations: int
     messages: Annotated[list[AnyMessage], operator.add]
 
 load_dotenv()
@@ -31,29 +35,106 @@ llm = ChatOpenAI(
     api_key=os.getenv("OPENAI_API_KEY")
 )
 
+# Articles longer than REFERENCE_CHARS are summarized map-reduce: every chunk
+# is digested on its own, concurrently, and the rest of the graph (summary,
+# questions, evaluation) works from the digests instead of the raw text, so
+# no prompt grows with the length of the article.
+CHUNK_CHARS = 12000          # per map call; pages are kept whole when they fit
+DIGEST_MAX_TOKENS = 500      # cap on each chunk digest
+REFERENCE_CHARS = 16000      # shorter articles are used as they are; digests are merged until they fit
+MAX_CONCURRENCY = 6          # chunk digests in flight at once
+MAX_ITERATIONS = 5
+
+digest_llm = llm.bind(max_tokens=DIGEST_MAX_TOKENS)
+token_usage = {}             # node -> [calls, input tokens, output tokens]
+
+def record_usage(node: str, responses) -> None:
+    for res in responses:
+        usage = res.usage_metadata or {}
+        totals = token_usage.setdefault(node, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += usage.get("input_tokens", 0)
+        totals[2] += usage.get("output_tokens", 0)
+
+def split_pages(pages: list[str], size: int = CHUNK_CHARS) -> list[str]:
+    # Consecutive pages are packed into chunks of up to `size` characters; a
+    # page longer than that is cut at paragraph breaks.
+    pieces = []
+    for page in pages:
+        while len(page) > size:
+            cut = page.rfind("\n\n", 0, size)
+            cut = cut if cut > size // 2 else size
+            pieces.append(page[:cut])
+            page = page[cut:].lstrip()
+        pieces.append(page)
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + len(piece) + 2 <= size:
+            chunks[-1] += "\n\n" + piece
+        else:
+            chunks.append(piece)
+    return [chunk for chunk in chunks if chunk.strip()]
+
 def read_article(state: SummaryState) -> dict:
     loader = PyPDFLoader(state["pdf_path"])
     pages = loader.load()
     text = "\n\n".join([p.page_content for p in pages])
-    return {"pdf_text": text}
+    return {"pdf_text": text, "chunks": split_pages([p.page_content for p in pages])}
+
+def digest_chunks(state: SummaryState) -> dict:
+    chunks = state["chunks"]
+    if len(state["pdf_text"]) <= REFERENCE_CHARS:
+        return {"reference": state["pdf_text"], "chunked": False}
+    prompts = [[HumanMessage(content=f"""
+Διαβάστε το παρακάτω τμήμα ({i + 1} από {len(chunks)}) ενός ελληνικού άρθρου και καταγράψτε με σύντομα bullets
+όλα τα βασικά σημεία, ονόματα, αριθμούς και ημερομηνίες του, ώστε να μπορεί να ελεγχθεί μια περίληψη χωρίς το πλήρες κείμενο:
+
+{chunk}
+""")] for i, chunk in enumerate(chunks)]
+    responses = digest_llm.batch(prompts, config={"max_concurrency": MAX_CONCURRENCY})
+    record_usage("digest", responses)
+    digests = [res.content for res in responses]
+    # Very long articles: merge neighbouring digests until the whole set fits
+    # the reference budget.
+    while len(digests) > 1 and sum(len(d) for d in digests) > REFERENCE_CHARS:
+        groups = split_pages(digests)
+        if len(groups) == len(digests):
+            groups = ["\n\n".join(digests[i:i + 2]) for i in range(0, len(digests), 2)]
+        responses = digest_llm.batch([[HumanMessage(content=f"""
+Συμπτύξτε τα παρακάτω bullets από διαδοχικά τμήματα ενός άρθρου σε ένα σύντομο σύνολο bullets,
+κρατώντας όλα τα βασικά σημεία, ονόματα, αριθμούς και ημερομηνίες:
+
+{group}
+""")] for group in groups], config={"max_concurrency": MAX_CONCURRENCY})
+        record_usage("digest", responses)
+        digests = [res.content for res in responses]
+    reference = "\n\n".join(f"[Ενότητα {i + 1}]\n{digest}" for i, digest in enumerate(digests))
+    return {"reference": reference, "chunked": True}
+
+def article_label(state: SummaryState) -> str:
+    if state.get("chunked"):
+        return "τις παρακάτω σημειώσεις από τις ενότητες ενός ελληνικού άρθρου"
+    return "το παρακάτω ελληνικό άρθρο"
 
 def generate_summary(state: SummaryState) -> dict:
     prompt = f"""
-Διαβάστε το παρακάτω ελληνικό άρθρο και δημιουργήστε μία αρχική περίληψη με bullets. 
+Διαβάστε {article_label(state)} και δημιουργήστε μία αρχική περίληψη με bullets. 
 Κάθε bullet να αναφέρεται σε ένα βασικό σημείο του άρθρου:
 
-{state['pdf_text']}
+{state['reference']}
 """
     res = llm.invoke([HumanMessage(content=prompt)])
+    record_usage("summarize", [res])
     return {"summary": res.content}
 
 def generate_questions(state: SummaryState) -> dict:
     prompt = f"""
-Διαβάστε το παρακάτω ελληνικό άρθρο και δημιουργήστε 5-7 ερωτήσεις που να ελέγχουν την κατανόηση των βασικών του σημείων:
+Διαβάστε {article_label(state)} και δημιουργήστε 5-7 ερωτήσεις που να ελέγχουν την κατανόηση των βασικών του σημείων:
 
-{state['pdf_text']}
+{state['reference']}
 """
     res = llm.invoke([HumanMessage(content=prompt)])
+    record_usage("ask", [res])
     return {"questions": res.content}
 
 def answer_questions(state: SummaryState) -> dict:
@@ -67,14 +148,16 @@ def answer_questions(state: SummaryState) -> dict:
 {state['questions']}
 """
     res = llm.invoke([HumanMessage(content=prompt)])
+    record_usage("answer", [res])
     return {"answers": res.content}
 
 def evaluate_answers(state: SummaryState) -> dict:
+    source = "Σημειώσεις ενοτήτων του άρθρου" if state.get("chunked") else "Άρθρο"
     prompt = f"""
 Αξιολογήστε τις παρακάτω απαντήσεις βασισμένοι στο αρχικό άρθρο και δώστε σχόλια για το πώς μπορεί να βελτιωθεί η περίληψη ώστε να απαντώνται σωστά οι ερωτήσεις:
 
-Άρθρο:
-{state['pdf_text']}
+{source}:
+{state['reference']}
 
 Περίληψη:
 {state['summary']}
@@ -86,6 +169,7 @@ def evaluate_answers(state: SummaryState) -> dict:
 {state['answers']}
 """
     res = llm.invoke([HumanMessage(content=prompt)])
+    record_usage("evaluate", [res])
     evaluation_text = res.content
 
     success_phrases = ["δεν υπάρχουν προβλήματα", "όλα είναι σωστά", "η περίληψη είναι επαρκής"]
@@ -110,6 +194,7 @@ def improve_summary(state: SummaryState) -> dict:
 Βελτιώστε την περίληψη με βάση τα σχόλια. Η νέα περίληψη να είναι και πάλι σε μορφή bullets.
 """
     res = llm.invoke([HumanMessage(content=prompt)])
+    record_usage("revise", [res])
     return {"summary": res.content}
 
 def save_to_file(state: SummaryState) -> dict:
@@ -120,6 +205,7 @@ def save_to_file(state: SummaryState) -> dict:
 graph = StateGraph(SummaryState)
 
 graph.add_node("read", read_article)
+graph.add_node("digest", digest_chunks)
 graph.add_node("summarize", generate_summary)
 graph.add_node("ask", generate_questions)
 graph.add_node("answer", answer_questions)
@@ -128,8 +214,9 @@ graph.add_node("revise", improve_summary)
 graph.add_node("save", save_to_file)
 
 graph.set_entry_point("read")
-graph.add_edge("read", "summarize")
-graph.add_edge("read", "ask")
+graph.add_edge("read", "digest")
+graph.add_edge("digest", "summarize")
+graph.add_edge("digest", "ask")
 graph.add_edge("summarize", "answer")
 graph.add_edge("ask", "answer")
 graph.add_edge("answer", "evaluate")
@@ -138,7 +225,7 @@ graph.add_edge("evaluate", "revise")
 def loop_or_exit(state: SummaryState) -> str:
     if state.get("evaluation_complete"):
         return "save"
-    if state.get("iteration_count", 0) >= 5:
+    if state.get("iteration_count", 0) >= state.get("max_iterations", MAX_ITERATIONS):
         return "save"
     return "answer"
 
@@ -147,22 +234,25 @@ graph.add_edge("save", END)
 
 compiled_graph = graph.compile()
 
-def summarize_greek_pdf(pdf_path: str, output_path: str, iterations: int = 5):
+def summarize_greek_pdf(pdf_path: str, output_path: str, iterations: int = MAX_ITERATIONS):
     state = {
         "pdf_path": pdf_path,
         "output_path": output_path,
         "messages": [],
         "evaluation_complete": False,
-        "iteration_count": 0
+        "iteration_count": 0,
+        "max_iterations": iterations
     }
 
     try:
-        result = compiled_graph.invoke(state, config={"recursion_limit": iterations})
+        # read, digest, summarize/ask and save, plus answer/evaluate/revise per iteration
+        result = compiled_graph.invoke(state, config={"recursion_limit": 5 + 3 * iterations})
     except GraphRecursionError:
         print("⚠️ Recursion limit hit, saving current summary anyway…")
 
         if "pdf_text" not in state:
             state.update(read_article(state))
+            state.update(digest_chunks(state))
 
         if "summary" not in state:
             state.update(generate_summary(state))
@@ -170,6 +260,8 @@ def summarize_greek_pdf(pdf_path: str, output_path: str, iterations: int = 5):
         result = {"output_path": state["output_path"]}
 
     print("✅ Περίληψη αποθηκεύτηκε στο:", result["output_path"])
+    for node, (calls, input_tokens, output_tokens) in token_usage.items():
+        print(f"   {node}: {calls} κλήσεις, {input_tokens} tokens εισόδου, {output_tokens} tokens εξόδου")
 
 if __name__ == "__main__":
     summarize_greek_pdf("article.pdf", "summary.txt")
@@ -1,53 +1,187 @@
 import os
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from openai import OpenAI
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import streamlit as st
+from response_cache import ResponseCache, cache_key
 
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # any OpenAI-compatible server, e.g. debate_stub_server.py
+TAVILY_URL = os.getenv("TAVILY_URL", "https://api.tavily.com/search")  # or debate_stub_server.py's /search
 
 if not OPENAI_API_KEY or not TAVILY_API_KEY:
     raise ValueError("API keys not found. Set OPENAI_API_KEY and TAVILY_API_KEY as environment variables.")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
 
-def openai_response(prompt):
+MODEL = "gpt-3.5-turbo"
+SYSTEM_PROMPT = "You are a helpful assistant."
+MAX_TOKENS = 700
+TEMPERATURE = 0.7
+
+# Answers are reused across reruns, sessions and restarts; errors are never cached.
+@st.cache_resource
+def get_cache():
+    # Opened once per server process rather than on every rerun.
+    return ResponseCache()
+
+cache = get_cache()
+
+# Pro and con calls within a step don't depend on each other, so they run
+# side by side; the pool bounds how many requests are in flight at once.
+MAX_CONCURRENT_CALLS = 6
+
+@st.cache_resource
+def get_executor():
+    # One pool per server process, not per rerun, so the bound holds across
+    # every session.
+    return ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CALLS)
+
+executor = get_executor()
+
+# One pooled session for every search: connections are kept alive between
+# calls, transient failures are retried with backoff, and no call can hang.
+SEARCH_TIMEOUT = (3.05, 10)   # (connect, read) seconds
+SEARCH_RESULTS = 3            # evidence items fetched per side
+
+@st.cache_resource
+def get_search_session():
+    # Built once per server process, so kept-alive connections outlive reruns.
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_maxsize=MAX_CONCURRENT_CALLS, max_retries=Retry(
+        total=2, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=None)))
+    session.mount("http://", session.adapters["https://"])
+    return session
+
+search_session = get_search_session()
+
+CONTEXT_TOKEN_BUDGET = 400    # per side, for its rolling summary and for its quoted latest round
+CHARS_PER_TOKEN = 4           # rough estimate for English text, good enough for budgeting
+MAX_ROUNDS = 10
+
+def chat_completion(prompt, stream=False):
+    return client.chat.completions.create(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=MAX_TOKENS, 
+        temperature=TEMPERATURE,
+        stream=stream
+    )
+
+def completion_key(prompt):
+    return cache_key("chat", model=MODEL, system=SYSTEM_PROMPT, max_tokens=MAX_TOKENS,
+                     temperature=TEMPERATURE, prompt=prompt)
+
+def openai_response(prompt, stream=False):
+    # With stream=True, returns a generator of text pieces as they arrive.
+    if stream:
+        return stream_response(prompt)
+    key = completion_key(prompt)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=700, 
-            temperature=0.7
-        )
-        return response.choices[0].message.content.strip()
+        response = chat_completion(prompt)
+        text = response.choices[0].message.content.strip()
     except Exception as e:
         return f"Error: {e}"
+    cache.put(key, text)
+    return text
 
-def tavily_search(query):
-    url = f"https://api.tavily.ai/search?q={query}&key={TAVILY_API_KEY}"
+def is_error(text):
+    # A failed call's text: the whole answer, or the tail of a stream that
+    # broke off partway (see stream_response).
+    return text.startswith("Error:") or "\n\nError: " in text
+
+def stream_response(prompt):
+    key = completion_key(prompt)
+    cached = cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+    pieces = []
     try:
-        response = requests.get(url)
-        if response.status_code == 200:
-            results = response.json()
-            return results.get("results", [])[0].get("snippet", "No relevant results found.")
-        return "Error in Tavily API response."
+        for chunk in chat_completion(prompt, stream=True):
+            if chunk.choices and chunk.choices[0].delta.content:
+                pieces.append(chunk.choices[0].delta.content)
+                yield pieces[-1]
     except Exception as e:
-        return f"Error: {e}"
+        yield f"\n\nError: {e}" if pieces else f"Error: {e}"
+        return
+    cache.put(key, "".join(pieces).strip())
 
-def generate_arguments(topic):
-    pro_prompt = f"Provide the strongest arguments supporting the following topic: '{topic}'. Do not include any introductions, preambles, or disclaimers. List arguments as bullet points or numbered points."
-    con_prompt = f"Provide the strongest arguments against the following topic: '{topic}'. Do not include any introductions, preambles, or disclaimers. List arguments as bullet points or numbered points."
+def search_evidence(query, max_results=SEARCH_RESULTS):
+    # Returns [{"title", "url", "content"}, ...], or [] when the search fails.
+    key = cache_key("tavily", query=query, max_results=max_results)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        response = search_session.post(
+            TAVILY_URL,
+            json={"api_key": TAVILY_API_KEY, "query": query, "max_results": max_results},
+            timeout=SEARCH_TIMEOUT,
+        )
+        response.raise_for_status()
+        results = [
+            {"title": r.get("title", ""), "url": r.get("url", ""), "content": r.get("content", "")}
+            for r in response.json().get("results", [])[:max_results]
+        ]
+    except Exception as e:
+        print(f"Search failed for {query!r}: {e}")
+        return []
+    cache.put(key, results)
+    return results
+
+def tavily_search(query):
+    results = search_evidence(query)
+    if not results:
+        return "No relevant results found."
+    return results[0]["content"]
 
-    pro_args = openai_response(pro_prompt)
-    con_args = openai_response(con_prompt)
+class SideCalls:
+    # The pro and con calls of one debate step, issued together. When
+    # streaming, the workers also push (side, piece) onto `tokens` as text
+    # arrives and (side, None) when their side is done.
+    def __init__(self, pro_prompt, con_prompt, stream=False):
+        self.tokens = queue.Queue() if stream else None
+        self.futures = {
+            "pro": executor.submit(self._call, "pro", pro_prompt),
+            "con": executor.submit(self._call, "con", con_prompt),
+        }
 
-    return pro_args, con_args
+    def _call(self, side, prompt):
+        if self.tokens is None:
+            return openai_response(prompt)
+        pieces = []
+        try:
+            for piece in openai_response(prompt, stream=True):
+                pieces.append(piece)
+                self.tokens.put((side, piece))
+        finally:
+            self.tokens.put((side, None))
+        return "".join(pieces).strip()
 
-def debate_round(pro_args, con_args, round_num):
+    def results(self):
+        return self.futures["pro"].result(), self.futures["con"].result()
+
+def submit_sides(pro_prompt, con_prompt, stream=False):
+    return SideCalls(pro_prompt, con_prompt, stream)
+
+def submit_arguments(topic, stream=False):
+    pro_prompt = f"Provide the strongest arguments supporting the following topic: '{topic}'. Do not include any introductions, preambles, or disclaimers. List arguments as bullet points or numbered points."
+    con_prompt = f"Provide the strongest arguments against the following topic: '{topic}'. Do not include any introductions, preambles, or disclaimers. List arguments as bullet points or numbered points."
+    return submit_sides(pro_prompt, con_prompt, stream)
+
+def submit_rebuttals(pro_args, con_args, round_num, stream=False):
     print(f"\nRound {round_num}")
     print("Pro side arguments:")
     print(pro_args)
@@ -57,20 +191,183 @@ def debate_round(pro_args, con_args, round_num):
 
     pro_rebuttal_prompt = f"Here are the con side's arguments: {con_args}. Rebut them concisely."
     con_rebuttal_prompt = f"Here are the pro side's arguments: {pro_args}. Rebut them concisely."
+    return submit_sides(pro_rebuttal_prompt, con_rebuttal_prompt, stream)
 
-    pro_rebuttal = openai_response(pro_rebuttal_prompt)
-    con_rebuttal = openai_response(con_rebuttal_prompt)
+def generate_arguments(topic):
+    return submit_arguments(topic).results()
 
-    return pro_rebuttal, con_rebuttal
+def debate_round(pro_args, con_args, round_num):
+    return submit_rebuttals(pro_args, con_args, round_num).results()
 
-def conclude_debate(pro_args, con_args):
+def conclude_debate(pro_args, con_args, stream=False):
     conclusion_prompt = (
         f"Summarize the arguments and counterarguments presented for the topic. \n"
         f"Pro arguments: {pro_args}. \n"
         f"Con arguments: {con_args}. \n"
         "Determine which side presented stronger arguments based on logical reasoning, evidence, and persuasiveness."
     )
-    return openai_response(conclusion_prompt)
+    return openai_response(conclusion_prompt, stream)
+
+def clip_to_budget(text, budget=CONTEXT_TOKEN_BUDGET):
+    # Cuts text to about `budget` tokens, at a line or word boundary when possible.
+    limit = budget * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    boundary = max(cut.rfind("\n"), cut.rfind(" "))
+    return (cut[:boundary] if boundary > limit // 2 else cut).rstrip() + " ..."
+
+def format_evidence(results, budget=CONTEXT_TOKEN_BUDGET):
+    if not results:
+        return "none found"
+    lines = [f"[{i}] {r['title']}: {r['content']} ({r['url']})" for i, r in enumerate(results, start=1)]
+    return clip_to_budget("\n".join(lines), budget)
+
+class DebateContext:
+    # Keeps rebuttal and conclusion prompts the same size however many rounds
+    # run. Each side's earlier rounds live in a rolling summary capped at
+    # `budget` tokens; only the latest round is quoted, clipped to the same
+    # budget. Folding a round into the summaries runs in the background while
+    # the next round's rebuttals are being written, so it adds no waiting.
+    # Evidence for both sides is searched for as soon as the context is
+    # created, alongside the opening arguments, and quoted in every rebuttal
+    # and in the conclusion.
+    def __init__(self, topic, budget=CONTEXT_TOKEN_BUDGET):
+        self.topic = topic
+        self.budget = budget
+        self.summaries = {"pro": "", "con": ""}    # every round before `latest`
+        self.latest = {"pro": "", "con": ""}
+        self._folding = None
+        self._evidence = {
+            "pro": executor.submit(search_evidence, f"evidence supporting: {topic}"),
+            "con": executor.submit(search_evidence, f"evidence against: {topic}"),
+        }
+
+    def evidence(self, side):
+        return self._evidence[side].result()
+
+    def _summarize(self, side, summary, new_text):
+        words = self.budget * 3 // 4
+        prompt = (
+            f"Update this running summary of the {side} side's positions in a debate on '{self.topic}' "
+            f"with its newest arguments. Keep every distinct point, drop repetition, and stay under {words} words. "
+            "Reply with the summary only.\n"
+            f"Current summary: {summary or 'none yet'}\n"
+            f"Newest arguments: {clip_to_budget(new_text, self.budget)}"
+        )
+        text = openai_response(prompt)
+        # Never let a failed call replace what we already have.
+        return summary if is_error(text) else clip_to_budget(text, self.budget)
+
+    def record(self, pro, con, fold=True):
+        # The fold started by the previous record() has had a whole round to
+        # finish; adopt it, then start folding this round in. After the last
+        # round nothing would read that fold (the conclusion quotes the
+        # latest round itself), so pass fold=False there.
+        if self._folding is not None:
+            self.summaries = {side: future.result() for side, future in self._folding.items()}
+        self._folding = {
+            side: executor.submit(self._summarize, side, self.summaries[side], text)
+            for side, text in (("pro", pro), ("con", con))
+        } if fold else None
+        self.latest = {"pro": pro, "con": con}
+
+    def _so_far(self):
+        return (
+            "Summary of the earlier rounds:\n"
+            f"Pro: {self.summaries['pro'] or 'none yet'}\n"
+            f"Con: {self.summaries['con'] or 'none yet'}\n"
+        )
+
+    def submit_rebuttals(self, stream=False):
+        pro_latest = clip_to_budget(self.latest["pro"], self.budget)
+        con_latest = clip_to_budget(self.latest["con"], self.budget)
+        pro_rebuttal_prompt = (
+            f"Debate topic: '{self.topic}'. You argue for it.\n{self._so_far()}"
+            f"Evidence you can cite by number:\n{format_evidence(self.evidence('pro'), self.budget)}\n"
+            f"Here are the con side's latest arguments: {con_latest}. Rebut them concisely."
+        )
+        con_rebuttal_prompt = (
+            f"Debate topic: '{self.topic}'. You argue against it.\n{self._so_far()}"
+            f"Evidence you can cite by number:\n{format_evidence(self.evidence('con'), self.budget)}\n"
+            f"Here are the pro side's latest arguments: {pro_latest}. Rebut them concisely."
+        )
+        return submit_sides(pro_rebuttal_prompt, con_rebuttal_prompt, stream)
+
+    def conclude(self, stream=False):
+        conclusion_prompt = (
+            f"Summarize the arguments and counterarguments presented for the topic '{self.topic}'. \n"
+            f"{self._so_far()}"
+            f"Pro arguments in the final round: {clip_to_budget(self.latest['pro'], self.budget)}. \n"
+            f"Con arguments in the final round: {clip_to_budget(self.latest['con'], self.budget)}. \n"
+            f"Evidence gathered for the pro side: {format_evidence(self.evidence('pro'), self.budget // 2)}\n"
+            f"Evidence gathered for the con side: {format_evidence(self.evidence('con'), self.budget // 2)}\n"
+            "Determine which side presented stronger arguments over the whole debate based on logical reasoning, evidence, and persuasiveness."
+        )
+        return openai_response(conclusion_prompt, stream)
+
+def render_lines(side, label, text):
+    role = "assistant" if side == "pro" else "user"
+    for line in text.split("\n"):
+        if line.strip():
+            with st.chat_message(role):
+                st.markdown(f"**{label}:** {line}")
+
+def render_sides(calls, pro_label, con_label):
+    # Fills each side's column as soon as its text is available instead of
+    # waiting for the slower side: token by token when streaming, otherwise
+    # when its call finishes.
+    columns = dict(zip(("pro", "con"), st.columns(2)))
+    labels = {"pro": pro_label, "con": con_label}
+    if calls.tokens is None:
+        names = {future: side for side, future in calls.futures.items()}
+        for future in as_completed(names):
+            side = names[future]
+            with columns[side]:
+                render_lines(side, labels[side], future.result())
+        return calls.results()
+
+    slots = {side: column.empty() for side, column in columns.items()}
+    text = {"pro": "", "con": ""}
+    pending = {"pro", "con"}
+    while pending:
+        side, piece = calls.tokens.get()
+        if piece is None:
+            pending.discard(side)
+            with slots[side].container():
+                render_lines(side, labels[side], text[side].strip())
+        else:
+            text[side] += piece
+            slots[side].markdown(f"**{labels[side]}:** {text[side]}▌")
+    return calls.results()
+
+def render_evidence(evidence):
+    with st.expander("📚 Evidence used in the rebuttals", expanded=False):
+        for side, label in (("pro", "Pro"), ("con", "Con")):
+            st.markdown(f"**{label} side**")
+            if not evidence[side]:
+                st.caption("No search results.")
+            for i, r in enumerate(evidence[side], start=1):
+                st.markdown(f"[{i}] [{r['title'] or r['url']}]({r['url']}): {r['content'][:300]}")
+
+def render_transcript(transcript):
+    # Replays a finished debate from session state without any API calls.
+    st.subheader("Round 1: Arguments")
+    pro_col, con_col = st.columns(2)
+    with pro_col:
+        render_lines("pro", "Pro Side", transcript["arguments"][0])
+    with con_col:
+        render_lines("con", "Con Side", transcript["arguments"][1])
+    render_evidence(transcript["evidence"])
+    for round_num, (pro, con) in enumerate(transcript["rounds"], start=1):
+        st.subheader(f"Round {round_num}: Rebuttals")
+        pro_col, con_col = st.columns(2)
+        with pro_col:
+            render_lines("pro", "Pro Side Rebuttal", pro)
+        with con_col:
+            render_lines("con", "Con Side Rebuttal", con)
+    st.subheader("Debate Conclusion:")
+    st.write(transcript["conclusion"])
 
 if __name__ == "__main__":
 
@@ -79,49 +376,52 @@ if __name__ == "__main__":
     st.title("AI Debate System")
 
     topic = st.text_input("Enter the debate topic:")
+    stream = st.toggle("Stream responses as they are written", value=True)
+    num_rounds = st.slider("Rebuttal rounds", min_value=1, max_value=MAX_ROUNDS, value=3)
+
+    # Finished debates per topic; any rerun (a widget change, a refresh of
+    # the same session) shows the stored transcript instead of a new debate.
+    # Debates in which any call failed are not stored, so a rerun retries them.
+    debates = st.session_state.setdefault("debates", {})
 
-    if topic:
+    if topic and (topic, num_rounds) in debates:
         st.write(f"### Debate Topic: {topic}")
         st.write("---")
+        render_transcript(debates[(topic, num_rounds)])
 
-        pro_args, con_args = generate_arguments(topic)
-
-        pro_args_list = pro_args.split("\n") if "\n" in pro_args else [pro_args]
-        con_args_list = con_args.split("\n") if "\n" in con_args else [con_args]
+    elif topic:
+        st.write(f"### Debate Topic: {topic}")
+        st.write("---")
 
         st.subheader("Round 1: Arguments")
-        max_len = max(len(pro_args_list), len(con_args_list))
-        for i in range(max_len):
-            col1, col2 = st.columns(2)
-            with col1:
-                if i < len(pro_args_list) and pro_args_list[i].strip():
-                    with st.chat_message("assistant"):
-                        st.markdown(f"**Pro Side:** {pro_args_list[i]}")
-            with col2:
-                if i < len(con_args_list) and con_args_list[i].strip():
-                    with st.chat_message("user"):
-                        st.markdown(f"**Con Side:** {con_args_list[i]}")
-
-        num_rounds = 3
+        # Creating the context starts the evidence searches, so they run
+        # while the opening arguments are written.
+        context = DebateContext(topic)
+        pro_args, con_args = render_sides(submit_arguments(topic, stream), "Pro Side", "Con Side")
+        evidence = {side: context.evidence(side) for side in ("pro", "con")}
+        render_evidence(evidence)
+        transcript = {"arguments": (pro_args, con_args), "rounds": [], "evidence": evidence}
+        context.record(pro_args, con_args)
+
         for round_num in range(1, num_rounds + 1):
             st.subheader(f"Round {round_num}: Rebuttals")
             
             # Generate rebuttals
-            pro_args, con_args = debate_round(pro_args, con_args, round_num)
-            pro_args_list = pro_args.split("\n")
-            con_args_list = con_args.split("\n")
-
-            for pro, con in zip(pro_args_list, con_args_list):
-                col1, col2 = st.columns(2)
-                with col1:
-                    if pro.strip():
-                        with st.chat_message("assistant"):
-                            st.markdown(f"**Pro Side Rebuttal:** {pro}")
-                with col2:
-                    if con.strip():
-                        with st.chat_message("user"):
-                            st.markdown(f"**Con Side Rebuttal:** {con}")
-
-        result = conclude_debate(pro_args, con_args)
+            pro_args, con_args = render_sides(
+                context.submit_rebuttals(stream), "Pro Side Rebuttal", "Con Side Rebuttal"
+            )
+            transcript["rounds"].append((pro_args, con_args))
+            context.record(pro_args, con_args, fold=round_num < num_rounds)
+
         st.subheader("Debate Conclusion:")
-        st.write(result)
+        if stream:
+            result = st.write_stream(context.conclude(stream=True))
+        else:
+            result = context.conclude()
+            st.write(result)
+        transcript["conclusion"] = result
+        texts = [*transcript["arguments"], *(text for round_ in transcript["rounds"] for text in round_), result]
+        if any(is_error(text) for text in texts):
+            st.warning("Some responses failed, so this debate was not saved; rerun to try again.")
+        else:
+            debates[(topic, num_rounds)] = transcript
@@ -0,0 +1,131 @@
+"""Stand-in OpenAI-compatible chat and Tavily-style search server for
+exercising debate.py offline.
+
+Answers /v1/chat/completions with canned bullet points built from the prompt,
+either as one JSON response or as a server-sent event stream with a
+configurable delay before the first token and between tokens, so
+time-to-first-token and end-to-end latency can be measured without an API key.
+/search returns canned results after --search-ms, and --search-fail-rate makes
+some searches answer 503 to exercise the retries:
+
+    python debate_stub_server.py --port 8900 --first-token-ms 400 --token-ms 30 --search-ms 500
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 TAVILY_URL=http://127.0.0.1:8900/search \
+        OPENAI_API_KEY=x TAVILY_API_KEY=x streamlit run debate.py
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def canned_reply(prompt, points=4):
+    words = [w.strip(".,:;'\"") for w in prompt.split() if len(w) > 3][:points * 3]
+    lines = [f"- Point {i + 1}: " + " ".join(words[i * 3:i * 3 + 3] or ["no", "content"]) for i in range(points)]
+    return "\n".join(lines)
+
+
+def tokens(text):
+    # Roughly word-sized pieces, keeping the whitespace a real stream sends.
+    piece = ""
+    for ch in text:
+        piece += ch
+        if ch in " \n":
+            yield piece
+            piece = ""
+    if piece:
+        yield piece
+
+
+def search_results(query, n):
+    return [{
+        "title": f"Source {i + 1} on {query}",
+        "url": f"https://example.org/{i + 1}",
+        "content": f"Finding {i + 1} relevant to {query}.",
+        "score": 1.0 - i / 10,
+    } for i in range(n)]
+
+
+def make_handler(args):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def send_json(self, status, data):
+            payload = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path.rstrip("/") == "/search":
+                time.sleep(args.search_ms / 1000)
+                if random.random() < args.search_fail_rate:
+                    self.send_json(503, {"detail": "stub outage"})
+                else:
+                    self.send_json(200, {"query": body.get("query"),
+                                         "results": search_results(body.get("query", ""), body.get("max_results", 5))})
+                return
+            if self.path.rstrip("/") != "/v1/chat/completions":
+                self.send_error(404)
+                return
+            prompt = body["messages"][-1]["content"]
+            reply = canned_reply(prompt, args.points)
+            created = int(time.time())
+            time.sleep(args.first_token_ms / 1000)
+            if not body.get("stream"):
+                time.sleep(args.token_ms / 1000 * len(list(tokens(reply))))
+                self.send_json(200, {
+                    "id": "stub", "object": "chat.completion", "created": created, "model": body.get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": reply}}],
+                    "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(reply.split()),
+                              "total_tokens": len(prompt.split()) + len(reply.split())},
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send(data):
+                event = f"data: {data}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(event):X}\r\n".encode() + event + b"\r\n")
+                self.wfile.flush()
+
+            for i, piece in enumerate(tokens(reply)):
+                if i:
+                    time.sleep(args.token_ms / 1000)
+                send(json.dumps({
+                    "id": "stub", "object": "chat.completion.chunk", "created": created, "model": body.get("model"),
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }))
+            send("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve canned OpenAI-compatible chat completions.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--first-token-ms", type=float, default=400, help="delay before the first token")
+    parser.add_argument("--token-ms", type=float, default=30, help="delay between streamed tokens")
+    parser.add_argument("--points", type=int, default=4, help="bullet points per reply")
+    parser.add_argument("--search-ms", type=float, default=500, help="latency of /search")
+    parser.add_argument("--search-fail-rate", type=float, default=0.0, help="share of searches answered with 503")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args))
+    print(f"serving on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
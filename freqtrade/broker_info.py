@@ -1,52 +1,26 @@
-import ccxt
+# Depends on ../on-render-deployment: collection (collector.py, symbols.py and
+# the modules they import) lives there, next to the dashboard Render deploys,
+# and this dashboard only renders its snapshots. It is put on sys.path below,
+# so this file has to stay in a checkout that also has that directory, and a
+# change to those modules affects both dashboards. Install that directory's
+# requirements.txt as well.
+import os
+import sys
 import pandas as pd
 import streamlit as st
-from datetime import datetime, timezone
-import time
 
-EXCHANGES = ['binance', 'coinbase', 'kraken', 'bitfinex', 'kucoin']
-TOP_COINS = ['BTC/USDT', 'ETH/USDT', 'BNB/USDT', 'SOL/USDT', 'XRP/USDT']
-
-error_messages = []
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "on-render-deployment"))
+import collector
+from collector import TOP_COINS, POLL_INTERVAL_SEC, SNAPSHOT_SOURCE, error_messages, SnapshotPoller, SnapshotReader
+from symbols import TOP_N_PAIRS
 
 @st.cache_resource
-def load_exchanges():
-    exchange_objects = {}
-    for ex in EXCHANGES:
-        try:
-            exchange = getattr(ccxt, ex)()
-            exchange.load_markets()
-            exchange_objects[ex] = exchange
-        except Exception as e:
-            error_messages.append(f"[ERROR] Could not load {ex}: {e}")
-    return exchange_objects
-
-def fetch_all_metrics(exchanges, coins):
-    records = []
-    for coin in coins:
-        for ex_name, ex in exchanges.items():
-            try:
-                ticker = ex.fetch_ticker(coin)
-                data = {
-                    'Exchange': ex_name,
-                    'Pair': coin,
-                    'Price': ticker.get('last'),
-                    'Bid': ticker.get('bid'),
-                    'Ask': ticker.get('ask'),
-                    'High (24h)': ticker.get('high'),
-                    'Low (24h)': ticker.get('low'),
-                    'Volume (24h)': ticker.get('baseVolume'),
-                    'Quote Volume (24h)': ticker.get('quoteVolume'),
-                    '% Change': ticker.get('percentage'),
-                    'Change': ticker.get('change'),
-                    'Open': ticker.get('open'),
-                    'Timestamp': pd.to_datetime(ticker.get('timestamp'), unit='ms') if ticker.get('timestamp') else None,
-                }
-                data['Timestamp (UTC+3)'] = data['Timestamp'] + pd.Timedelta(hours=3)
-                records.append(data)
-            except Exception as e:
-                error_messages.append(f"[ERROR] {ex_name} - {coin}: {e}")
-    return pd.DataFrame(records)
+def get_poller():
+    # With SNAPSHOT_SOURCE set, a separate collector.py process does the
+    # polling and this dashboard only reads what it publishes.
+    if SNAPSHOT_SOURCE:
+        return SnapshotReader(SNAPSHOT_SOURCE)
+    return SnapshotPoller(collector.load_exchanges(), TOP_COINS, top_n=TOP_N_PAIRS)
 
 def main():
     st.set_page_config(page_title="Crypto Broker Information Dashboard", layout="wide")
@@ -54,31 +28,39 @@ def main():
     st.caption("Live metrics across top exchanges.")
     st.sidebar.header("Settings")
     
-    autorefresh = st.sidebar.toggle("Auto-refresh every 60 seconds", value=True)
+    autorefresh = st.sidebar.toggle(f"Auto-refresh every {POLL_INTERVAL_SEC} seconds", value=True)
 
-    exchanges = load_exchanges()
+    poller = get_poller()
     
     placeholder = st.empty()
+    version = 0
 
     while True:
-        error_messages.clear()
+        latest_version, df, errors, updated_at = poller.latest(version, timeout=2 * POLL_INTERVAL_SEC)
+        if latest_version == version:
+            continue
+        version = latest_version
 
         with placeholder.container():
-            now_utc3 = datetime.utcnow() + pd.Timedelta(hours=3)
-            st.markdown(f"#### Last updated: {now_utc3.strftime('%Y-%m-%d %H:%M:%S')} UTC+03:00")
-            df = fetch_all_metrics(exchanges, TOP_COINS)
+            updated_utc3 = updated_at + pd.Timedelta(hours=3)
+            st.markdown(f"#### Last updated: {updated_utc3.strftime('%Y-%m-%d %H:%M:%S')} UTC+03:00")
 
-            if error_messages:
+            # load_exchanges errors stay in the module log; refresh errors come with the snapshot
+            all_errors = list(error_messages) + errors
+            if all_errors:
                 with st.expander("⚠️ View Error Log", expanded=False):
-                    for msg in error_messages:
+                    for msg in all_errors:
                         st.warning(msg)
 
             st.subheader("🔍 Full Exchange Metrics")
-            st.dataframe(df.sort_values(by=['Pair', 'Exchange']), use_container_width=True)
+            # The first pass can fail on every exchange, leaving a frame without columns
+            if df.empty:
+                st.info("Waiting for the first ticker data...")
+            else:
+                st.dataframe(df.sort_values(by=['Pair', 'Exchange']), use_container_width=True)
 
         if not autorefresh:
             break
-        time.sleep(60)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+DEFAULT_TAKER_FEE = 0.001     # used when neither the market nor the exchange states a taker fee
+TOP_OPPORTUNITIES = 10
+
+
+def _codes(column):
+    values = column if isinstance(column.dtype, pd.CategoricalDtype) else column.astype("category")
+    values = values.cat.remove_unused_categories()
+    return values.cat.codes.to_numpy(), list(values.cat.categories)
+
+
+def taker_fee(exchange, pair):
+    if exchange is None:
+        return DEFAULT_TAKER_FEE
+    market = (exchange.markets or {}).get(pair) or {}
+    fee = market.get("taker")
+    if fee is None:
+        fee = (exchange.fees or {}).get("trading", {}).get("taker")
+    return DEFAULT_TAKER_FEE if fee is None else float(fee)
+
+
+def market_symbols(df):
+    # The market each row was actually quoted on: the snapshot's Symbol column
+    # when it has one (canonical BTC/USD rows may come from BTC/USDT), else the
+    # pair itself.
+    pairs = df["Pair"].astype(str)
+    if "Symbol" not in df:
+        return pairs
+    return df["Symbol"].astype(object).where(df["Symbol"].notna(), pairs).astype(str)
+
+
+def quote_currency(symbol):
+    # "BTC/USDT" -> "USDT", "BTC/USDT:USDT" -> "USDT"
+    return symbol.split("/")[-1].split(":")[0]
+
+
+def row_fees(df, exchanges, symbols):
+    # Taker fee of each row's own market on its venue.
+    return np.array([taker_fee(exchanges.get(ex_name), symbol)
+                     for ex_name, symbol in zip(df["Exchange"].astype(str), symbols)], dtype=float)
+
+
+def spread_matrix(df, exchanges=None):
+    # Net edge in bps of buying a pair at the ask on one venue and selling it at
+    # the bid on another, after taker fees on both legs, for every book and
+    # every ordered venue pair: edge[b, sell, buy]. A book is a pair in one
+    # quote currency, so USDT asks are only compared with USDT bids and the
+    # stablecoin basis never shows up as an edge. Computed in one broadcast.
+    symbols = market_symbols(df)
+    book_codes, books = pd.factorize(pd.MultiIndex.from_arrays([df["Pair"].astype(str), symbols.map(quote_currency)]),
+                                     sort=True)
+    books = list(books)
+    ex_codes, exchange_names = _codes(df["Exchange"])
+    bid = np.full((len(books), len(exchange_names)), np.nan)
+    ask = np.full_like(bid, np.nan)
+    bid[book_codes, ex_codes] = df["Bid"].to_numpy(dtype=float)
+    ask[book_codes, ex_codes] = df["Ask"].to_numpy(dtype=float)
+    bid[bid <= 0] = np.nan
+    ask[ask <= 0] = np.nan
+
+    fees = np.full_like(bid, DEFAULT_TAKER_FEE)
+    fees[book_codes, ex_codes] = row_fees(df, exchanges or {}, symbols)
+    sell = bid * (1 - fees)
+    buy = ask * (1 + fees)
+    with np.errstate(invalid="ignore"):
+        edge = (sell[:, :, None] - buy[:, None, :]) / buy[:, None, :] * 1e4
+        gross = (bid[:, :, None] - ask[:, None, :]) / ask[:, None, :] * 1e4
+    same_venue = np.eye(len(exchange_names), dtype=bool)
+    edge[:, same_venue] = np.nan
+    gross[:, same_venue] = np.nan
+    return books, exchange_names, edge, gross, bid, ask
+
+
+def top_opportunities(df, exchanges=None, n=TOP_OPPORTUNITIES):
+    columns = ["Pair", "Quote", "Buy on", "Ask", "Sell on", "Bid", "Gross (bps)", "Net (bps)"]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+    books, exchange_names, edge, gross, bid, ask = spread_matrix(df, exchanges)
+    flat = edge.ravel()
+    candidates = np.flatnonzero(~np.isnan(flat))
+    if candidates.size == 0:
+        return pd.DataFrame(columns=columns)
+    n = min(n, candidates.size)
+    best = candidates[np.argpartition(-flat[candidates], n - 1)[:n]]
+    best = best[np.argsort(-flat[best])]
+    p, s, b = np.unravel_index(best, edge.shape)
+    return pd.DataFrame({
+        "Pair": np.asarray([pair for pair, _ in books], dtype=object)[p],
+        "Quote": np.asarray([quote for _, quote in books], dtype=object)[p],
+        "Buy on": np.asarray(exchange_names, dtype=object)[b],
+        "Ask": ask[p, b],
+        "Sell on": np.asarray(exchange_names, dtype=object)[s],
+        "Bid": bid[p, s],
+        "Gross (bps)": gross[p, s, b],
+        "Net (bps)": edge[p, s, b],
+    })
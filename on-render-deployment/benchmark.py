@@ -0,0 +1,261 @@
+"""Offline benchmark for the dashboard refresh path.
+
+Runs load_exchange, collect_tickers, snapshot building, the arbitrage matrix,
+history appends and chart figure building against FakeExchange stand-ins with
+configurable latency, jitter, error rate and market size, and reports wall
+time per stage, peak memory and request counts for every coins x exchanges
+combination:
+
+    python benchmark.py --coins 5,50,200 --exchanges 5,10 --latency-ms 80
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json --tolerance 0.25
+
+--compare exits with status 1 when a stage got slower than the baseline by
+more than the tolerance. Peak memory is the process RSS high-water mark;
+--tracemalloc reports per-scenario Python allocations instead, at the cost of
+much slower stage timings.
+"""
+import argparse
+import json
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import ccxt
+import pandas as pd
+
+import arbitrage
+import charts
+import collector
+from health import HealthTracker
+from history import TickerHistory
+from snapshot import build_snapshot
+
+MIN_REGRESSION_SEC = 0.005
+
+
+class FakeExchange:
+    # Minimal ccxt stand-in: the attributes and calls the dashboard uses, with
+    # simulated latency and failures, counting every request it serves.
+    def __init__(self, name, n_symbols=200, latency_ms=50, jitter_ms=10, error_rate=0.0,
+                 rate_limit_ms=50, batch=True, seed=0):
+        self.id = name
+        self.rateLimit = rate_limit_ms
+        self.timeout = collector.CALL_TIMEOUT_MS
+        self.has = {'fetchTickers': batch}
+        self.fees = {'trading': {'taker': 0.001}}
+        self.markets = None
+        self.currencies = None
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.requests = Counter()
+        self.symbols_list = symbol_universe(n_symbols)
+        self._rng = random.Random(f"{name}-{seed}")
+        self._lock = threading.Lock()
+
+    def _request(self, method):
+        with self._lock:
+            self.requests[method] += 1
+            delay = max(0.0, self._rng.gauss(self.latency_ms, self.jitter_ms)) / 1000
+            failed = self._rng.random() < self.error_rate
+        time.sleep(delay)
+        if failed:
+            raise ccxt.NetworkError(f"{self.id} {method}: simulated failure")
+
+    def set_markets(self, markets, currencies=None):
+        values = markets.values() if isinstance(markets, dict) else markets
+        self.markets = {market['symbol']: market for market in values}
+        self.currencies = currencies or {}
+        return self.markets
+
+    def load_markets(self, reload=False):
+        if self.markets and not reload:
+            return self.markets
+        self._request('load_markets')
+        markets = []
+        for symbol in self.symbols_list:
+            base, quote = symbol.split('/')
+            markets.append({
+                'id': base + quote, 'symbol': symbol, 'base': base, 'quote': quote,
+                'type': 'spot', 'spot': True, 'active': True, 'taker': 0.001, 'maker': 0.001,
+                'precision': {'amount': 1e-6, 'price': 1e-2},
+                'limits': {'amount': {'min': 1e-6, 'max': None}, 'cost': {'min': 5, 'max': None}},
+                'info': {'symbol': base + quote, 'status': 'TRADING', 'filters': [{'minQty': '0.000001'}] * 4},
+            })
+        currencies = {code: {'id': code, 'code': code} for symbol in self.symbols_list for code in symbol.split('/')}
+        return self.set_markets(markets, currencies)
+
+    def _ticker(self, symbol):
+        price = 10 + zlib.crc32(symbol.encode()) % 10_000
+        mid = price * (1 + self._rng.gauss(0, 0.001))
+        return {
+            'symbol': symbol, 'timestamp': int(time.time() * 1000),
+            'last': mid, 'bid': mid * 0.9999, 'ask': mid * 1.0001,
+            'high': mid * 1.02, 'low': mid * 0.98, 'open': price,
+            'baseVolume': 1000.0, 'quoteVolume': 1000.0 * mid,
+            'change': mid - price, 'percentage': (mid - price) / price * 100,
+        }
+
+    def fetch_ticker(self, symbol):
+        self._request('fetch_ticker')
+        if symbol not in self.markets:
+            raise ccxt.BadSymbol(f"{self.id} does not have market symbol {symbol}")
+        return self._ticker(symbol)
+
+    def fetch_tickers(self, symbols=None):
+        self._request('fetch_tickers')
+        return {symbol: self._ticker(symbol) for symbol in (symbols or self.symbols_list) if symbol in self.markets}
+
+
+def symbol_universe(n):
+    symbols = list(collector.TOP_COINS)
+    symbols += [f"C{i:04d}/USDT" for i in range(max(0, n - len(symbols)))]
+    return symbols[:n]
+
+
+def timed(stages, name, fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    stages[name] = time.perf_counter() - started
+    return result
+
+
+def run_scenario(n_coins, n_exchanges, args):
+    exchanges = {
+        f"fake{i}": FakeExchange(
+            f"fake{i}", n_symbols=max(n_coins, args.symbols), latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms, error_rate=args.error_rate, rate_limit_ms=args.rate_limit_ms,
+            seed=args.seed,
+        )
+        for i in range(n_exchanges)
+    }
+    coins = symbol_universe(n_coins)
+    stages = {}
+    errors = []
+    if args.tracemalloc:
+        tracemalloc.start()
+    with tempfile.TemporaryDirectory() as cache_dir:
+        def load_all():
+            # Mirrors load_exchanges: venues that fail to load are dropped.
+            with ThreadPoolExecutor(max_workers=n_exchanges) as pool:
+                futures = {name: pool.submit(collector.load_exchange, name, ex, cache_dir) for name, ex in exchanges.items()}
+            for name, future in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(f"[ERROR] Could not load {name}: {e}")
+
+        timed(stages, 'load (cold)', load_all)
+        for ex in exchanges.values():
+            ex.markets = None
+        timed(stages, 'load (cached)', load_all)
+    loaded = {name: ex for name, ex in exchanges.items() if ex.markets}
+
+    started = time.perf_counter()
+    # A fresh breaker per scenario, so one run's simulated failures do not
+    # leave circuits open for the next.
+    tickers = timed(stages, 'collect', collector.collect_tickers, loaded, coins,
+                    deadline=args.deadline, error_log=errors, health=HealthTracker())
+    df = timed(stages, 'snapshot', build_snapshot, tickers, loaded, coins)
+    timed(stages, 'arbitrage', arbitrage.top_opportunities, df, loaded)
+    history = TickerHistory(max_series=len(df) or 1)
+    timed(stages, 'history', history.append, df)
+
+    def build_charts():
+        for y_col, y_label, log_y in [("Price", "Last Price", False), ("Volume (24h)", "Volume", True),
+                                      ("% Change", "% Change", False), ("Spread", "Ask - Bid", False)]:
+            charts.faceted_bar(df, y_col, y_label, log_y).to_json()
+
+    if not args.skip_charts:
+        timed(stages, 'charts', build_charts)
+    refresh = time.perf_counter() - started
+    if args.tracemalloc:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    else:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024   # ru_maxrss is KiB on Linux
+
+    requests = Counter()
+    for ex in exchanges.values():
+        requests.update(ex.requests)
+    result = {
+        'coins': n_coins,
+        'exchanges': n_exchanges,
+        'rows': len(df),
+        'errors': len(errors),
+        'refresh (s)': refresh,
+        'peak memory (MB)': peak / 2**20,
+        'ticker requests': requests['fetch_ticker'] + requests['fetch_tickers'],
+        'load requests': requests['load_markets'],
+    }
+    result.update({f'{name} (s)': seconds for name, seconds in stages.items()})
+    return result
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['coins'], r['exchanges']): r for r in json.load(f)}
+    regressions = []
+    for result in results:
+        base = baseline.get((result['coins'], result['exchanges']))
+        if not base:
+            continue
+        for key, value in result.items():
+            if key not in base or not key.endswith('(s)'):
+                continue
+            # Ignore millisecond noise on tiny stages.
+            if value > base[key] * (1 + tolerance) and value - base[key] > MIN_REGRESSION_SEC:
+                regressions.append(f"{result['coins']} coins x {result['exchanges']} exchanges: "
+                                   f"{key} {base[key]:.3f} -> {value:.3f}")
+    return regressions
+
+
+def int_list(text):
+    return [int(part) for part in text.split(',') if part]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard refresh path against fake exchanges.")
+    parser.add_argument("--coins", type=int_list, default=[5, 50, 200], help="comma-separated pair counts")
+    parser.add_argument("--exchanges", type=int_list, default=[5], help="comma-separated exchange counts")
+    parser.add_argument("--symbols", type=int, default=500, help="markets listed per fake exchange")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-ms", type=float, default=50)
+    parser.add_argument("--deadline", type=float, default=collector.REFRESH_DEADLINE_SEC)
+    parser.add_argument("--no-batch", action="store_true", help="force per-symbol fetch_ticker calls")
+    parser.add_argument("--skip-charts", action="store_true")
+    parser.add_argument("--tracemalloc", action="store_true", help="per-scenario Python allocation peak (slow)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write results as JSON for later --compare")
+    parser.add_argument("--compare", help="baseline JSON from --save")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown per stage for --compare")
+    args = parser.parse_args()
+
+    collector.BATCH_TICKERS = not args.no_batch
+    results = []
+    for n_exchanges in args.exchanges:
+        for n_coins in args.coins:
+            results.append(run_scenario(n_coins, n_exchanges, args))
+            print(f"done: {n_coins} coins x {n_exchanges} exchanges", file=sys.stderr)
+
+    with pd.option_context("display.max_columns", None, "display.width", 250, "display.float_format", "{:.3f}".format):
+        print(pd.DataFrame(results).to_string(index=False))
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
@@ -1,74 +1,159 @@
-import ccxt
+import os
 import pandas as pd
 import streamlit as st
 from datetime import datetime, timezone
 import time
+import threading
 import plotly.express as px
-import uuid  
+import streaming
+import collector
+from collector import (EXCHANGES, TOP_COINS, POLL_INTERVAL_SEC, SNAPSHOT_SOURCE, HEALTH,
+                       error_messages, collect_tickers, SnapshotPoller, SnapshotReader)
+from symbols import TOP_N_PAIRS
+from history import TickerHistory
+from snapshot import SnapshotBuilder
+from charts import IncrementalChart, MetricChart, data_fingerprint
+import arbitrage
+from orderbook import OrderBookCollector, OrderBookManager
+from instrumentation import METRICS, serve_metrics
 
-EXCHANGES = ['binance', 'coinbase', 'kraken', 'bitfinex', 'kucoin']
-TOP_COINS = ['BTC/USDT', 'ETH/USDT', 'BNB/USDT', 'SOL/USDT', 'XRP/USDT']
-
-error_messages = []
+STREAM_PUBLISH_SEC = 1        # how often streaming mode turns the live table into a snapshot
+STREAM_STALE_SEC = 30         # streamed rows older than this are refilled over REST
+TICKER_REPLAY_URL = os.getenv("TICKER_REPLAY_URL")    # e.g. ws://127.0.0.1:8765/ws, see replay_server.py
+TICKER_RECORD_PATH = os.getenv("TICKER_RECORD_PATH")  # append every streamed ticker here for later replay
+HISTORY_ARCHIVE_DIR = os.getenv("HISTORY_ARCHIVE_DIR")  # Parquet archive of ticker history, off when unset
+HISTORY_WINDOWS = {"15 minutes": 15, "1 hour": 60, "6 hours": 360, "24 hours": 1440}
+ORDERBOOK_REPLAY_PATH = os.getenv("ORDERBOOK_REPLAY_PATH")  # recorded book updates to serve instead of live books
+ORDERBOOK_RECORD_PATH = os.getenv("ORDERBOOK_RECORD_PATH")  # append live book updates here for later replay
 
 @st.cache_resource
 def load_exchanges():
-    exchange_objects = {}
-    for ex in EXCHANGES:
-        try:
-            exchange = getattr(ccxt, ex)()
-            exchange.load_markets()
-            exchange_objects[ex] = exchange
-        except Exception as e:
-            error_messages.append(f"[ERROR] Could not load {ex}: {e}")
-    return exchange_objects
-
-def fetch_all_metrics(exchanges, coins):
-    records = []
-    for coin in coins:
-        for ex_name, ex in exchanges.items():
-            try:
-                ticker = ex.fetch_ticker(coin)
-                data = {
-                    'Exchange': ex_name,
-                    'Pair': coin,
-                    'Price': ticker.get('last'),
-                    'Bid': ticker.get('bid'),
-                    'Ask': ticker.get('ask'),
-                    'High (24h)': ticker.get('high'),
-                    'Low (24h)': ticker.get('low'),
-                    'Volume (24h)': ticker.get('baseVolume'),
-                    'Quote Volume (24h)': ticker.get('quoteVolume'),
-                    '% Change': ticker.get('percentage'),
-                    'Change': ticker.get('change'),
-                    'Open': ticker.get('open'),
-                    'Timestamp': pd.to_datetime(ticker.get('timestamp'), unit='ms') if ticker.get('timestamp') else None,
-                }
-                data['Timestamp (UTC+3)'] = data['Timestamp'] + pd.Timedelta(hours=3)
-                records.append(data)
-            except Exception as e:
-                error_messages.append(f"[ERROR] {ex_name} - {coin}: {e}")
-    return pd.DataFrame(records)
-
-def display_charts_grid(df_subset, y_col, title_prefix, y_label, color_col="Exchange", log_y=False):
-    coins = df_subset["Pair"].unique()
-    num_cols = 3
-    unique_id = str(uuid.uuid4())
-
-    for i in range(0, len(coins), num_cols):
-        cols = st.columns(num_cols)
-        for j, coin in enumerate(coins[i:i + num_cols]):
-            with cols[j]:
-                fig = px.bar(
-                    df_subset[df_subset["Pair"] == coin],
-                    x="Exchange",
-                    y=y_col,
-                    color=color_col,
-                    title=f"{coin}",
-                    labels={y_col: y_label},
-                    log_y=log_y,
-                )
-                st.plotly_chart(fig, use_container_width=True, key=f"{unique_id}-{y_col}-{coin}")
+    return collector.load_exchanges()
+
+class StreamingPoller(SnapshotPoller):
+    # Publishes the streamed latest-ticker table every STREAM_PUBLISH_SEC when it
+    # has changed. Pairs the stream has not delivered, or has let go stale, are
+    # filled from the REST path at most once per POLL_INTERVAL_SEC.
+    def __init__(self, exchanges, coins, table, collector, history=None):
+        self.table = table
+        self.collector = collector
+        self._rest_rows = {}
+        self._rest_thread = None
+        self._rest_errors = []
+        self._last_rest = 0
+        self._published = None
+        super().__init__(exchanges, coins, interval=STREAM_PUBLISH_SEC, history=history)
+
+    def _refresh_rest(self, exchanges):
+        errors = []
+        tickers = collect_tickers(exchanges, self.coins, error_log=errors)
+        fetched_at = time.time()
+        rows = {key: {"ticker": ticker, "source": "rest", "received_at": fetched_at, "sent_at": None}
+                for key, ticker in tickers.items()}
+        self._rest_rows = {**self._rest_rows, **rows}
+        self._rest_errors = errors
+
+    def collect(self, errors):
+        rows, table_version = self.table.rows()
+        keys = [(ex_name, coin) for coin in self.coins for ex_name in EXCHANGES]
+        stale = self.table.stale_pairs(keys, STREAM_STALE_SEC)
+        stale_exchanges = {ex_name: self.exchanges[ex_name] for ex_name, _ in stale if ex_name in self.exchanges}
+        rest_idle = self._rest_thread is None or not self._rest_thread.is_alive()
+        if stale_exchanges and rest_idle and time.monotonic() - self._last_rest >= POLL_INTERVAL_SEC:
+            self._last_rest = time.monotonic()
+            self._rest_thread = threading.Thread(target=self._refresh_rest, args=(stale_exchanges,), daemon=True)
+            self._rest_thread.start()
+
+        rest_rows = self._rest_rows
+        state = (table_version, id(rest_rows))
+        if state == self._published:
+            return None
+        self._published = state
+
+        stale = set(stale)
+        builder = SnapshotBuilder()
+        for key in keys:
+            if key in rows and (key not in stale or key not in rest_rows):
+                row = rows[key]
+            elif key in rest_rows:
+                row = rest_rows[key]
+            else:
+                continue
+            builder.add(key[0], key[1], row["ticker"],
+                        Source=row["source"], Received=row["received_at"], Sent=row["sent_at"])
+        errors.extend(self.collector.errors)
+        errors.extend(self._rest_errors)
+        started = time.perf_counter()
+        df = builder.build()
+        METRICS.observe_stage('snapshot_build', time.perf_counter() - started)
+        return df
+
+@st.cache_resource
+def get_history():
+    return TickerHistory(archive_dir=HISTORY_ARCHIVE_DIR)
+
+@st.cache_resource
+def get_poller():
+    # With SNAPSHOT_SOURCE set, a separate collector.py process does the
+    # polling and this dashboard only reads what it publishes.
+    if SNAPSHOT_SOURCE:
+        return SnapshotReader(SNAPSHOT_SOURCE, history=get_history())
+    return SnapshotPoller(load_exchanges(), TOP_COINS, history=get_history(), top_n=TOP_N_PAIRS)
+
+@st.cache_resource
+def get_stream_poller():
+    # In replay mode nothing touches the network, not even load_markets.
+    exchanges = {} if TICKER_REPLAY_URL else load_exchanges()
+    table = streaming.TickerTable()
+    collector = streaming.StreamingCollector(
+        table,
+        EXCHANGES if TICKER_REPLAY_URL else list(exchanges),
+        TOP_COINS,
+        markets={name: ex.markets for name, ex in exchanges.items()},
+        replay_url=TICKER_REPLAY_URL,
+        record_path=TICKER_RECORD_PATH,
+    ).start()
+    return StreamingPoller(exchanges, TOP_COINS, table, collector, history=get_history())
+
+@st.cache_resource
+def get_orderbooks():
+    exchanges = {} if ORDERBOOK_REPLAY_PATH else load_exchanges()
+    manager = OrderBookManager()
+    OrderBookCollector(
+        manager,
+        list(exchanges),
+        TOP_COINS,
+        markets={name: ex.markets for name, ex in exchanges.items()},
+        replay_path=ORDERBOOK_REPLAY_PATH,
+        record_path=ORDERBOOK_RECORD_PATH,
+    ).start()
+    return manager
+
+@st.cache_resource
+def get_metrics_server():
+    try:
+        return serve_metrics()
+    except OSError as e:
+        error_messages.append(f"[ERROR] Metrics endpoint unavailable: {e}")
+        return None
+
+def exchange_health():
+    # Circuit state and timeout next to the call statistics, one row per exchange.
+    circuits = HEALTH.summary()
+    calls = METRICS.exchange_summary()
+    if circuits.empty or calls.empty:
+        return calls if circuits.empty else circuits
+    return circuits.merge(calls, on='Exchange', how='outer')
+
+def update_latency_ms(df, rendered_at, since):
+    # Time from a ticker reaching this process to the frame that showed it.
+    if 'Received' not in df:
+        return None
+    received = df['Received'].dropna()
+    received = received[received > since]
+    if received.empty:
+        return None
+    return (rendered_at - received) * 1000
 
 def main():
     st.set_page_config(page_title="Crypto Broker Information Dashboard", layout="wide")
@@ -76,66 +161,153 @@ def main():
     st.caption("Live metrics across top exchanges.")
     st.sidebar.header("Settings")
     
-    autorefresh = st.sidebar.toggle("Auto-refresh every 60 seconds", value=True)
+    source = st.sidebar.radio("Data source", ["Polling (REST)", "Streaming (WebSocket)"])
+    streaming_mode = source.startswith("Streaming")
+    refresh_label = "Live updates" if streaming_mode else f"Auto-refresh every {POLL_INTERVAL_SEC} seconds"
+    autorefresh = st.sidebar.toggle(refresh_label, value=True)
+    show_depth = st.sidebar.toggle("Order-book depth and slippage", value=False)
 
-    exchanges = load_exchanges()
-    
-    placeholder = st.empty()
+    metrics_server = get_metrics_server()
+    with st.sidebar.expander("📡 Exchange Health", expanded=False):
+        if metrics_server:
+            host, port = metrics_server.server_address[:2]
+            st.caption(f"Scrape endpoint: http://{host}:{port}/metrics")
+        health_slot = st.empty()
+        stages_slot = st.empty()
+
+    poller = get_stream_poller() if streaming_mode else get_poller()
+
+    # The polled pair universe comes from the symbol index once it is built.
+    st.sidebar.subheader("History")
+    history_pair = st.sidebar.selectbox("Pair", list(poller.coins) or TOP_COINS)
+    history_metric = st.sidebar.selectbox("Metric", ["Price", "Spread"])
+    history_window = st.sidebar.selectbox("Window", list(HISTORY_WINDOWS))
+    history = get_history()
+
+    # The page layout is created once; each refresh only fills these slots, and
+    # charts whose data did not change are not sent to the browser again.
+    updated_slot = st.empty()
+    latency_slot = st.empty()
+    errors_slot = st.empty()
+    st.subheader("🔍 Full Exchange Metrics")
+    table_slot = st.empty()
+    st.subheader("💸 Price Per Coin")
+    price_chart = MetricChart("Price", "Last Price")
+    st.subheader("📊 24h Trading Volume")
+    volume_chart = MetricChart("Volume (24h)", "Volume", log_y=True)
+    st.subheader("📈 24h % Change")
+    change_chart = MetricChart("% Change", "% Change")
+    st.subheader("🔎 Bid-Ask Spread")
+    spread_chart = MetricChart("Spread", "Ask - Bid")
+    st.subheader("⚖️ Cross-Exchange Opportunities (after taker fees)")
+    st.caption("Buy at the ask on one venue, sell at the bid on another; best net edges first. "
+               "Only venues quoting the pair in the same currency are compared, so a USDT/USD basis is not an edge.")
+    arb_slot = st.empty()
+    if show_depth:
+        orderbooks = get_orderbooks()
+        st.subheader("📚 Order-Book Depth and Slippage")
+        st.caption("Depth is quote notional within the given distance from mid; slippage is the cost versus mid of a market order of that quote size.")
+        depth_slot = st.empty()
+    st.subheader("⏱ Data Freshness (Age in Seconds)")
+    fresh_chart = IncrementalChart("freshness")
+    st.subheader(f"🕰 {history_pair} {history_metric} History")
+    history_chart = IncrementalChart("history")
+
+    version = 0
+    last_render = 0
 
     while True:
-        error_messages.clear()
+        latest_version, df, errors, updated_at = poller.latest(version, timeout=2 * POLL_INTERVAL_SEC)
+        if latest_version == version:
+            continue
+        version = latest_version
 
-        with placeholder.container():
-            now_utc3 = datetime.utcnow() + pd.Timedelta(hours=3)
-            st.markdown(f"#### Last updated: {now_utc3.strftime('%Y-%m-%d %H:%M:%S')} UTC+03:00")
-            df = fetch_all_metrics(exchanges, TOP_COINS)
+        updated_utc3 = updated_at + pd.Timedelta(hours=3)
+        updated_slot.markdown(f"#### Last updated: {updated_utc3.strftime('%Y-%m-%d %H:%M:%S')} UTC+03:00")
 
-            if error_messages:
+        # load_exchanges errors stay in the module log; refresh errors come with the snapshot
+        all_errors = list(error_messages) + errors
+        if show_depth:
+            all_errors += list(orderbooks.errors)
+        if all_errors:
+            with errors_slot.container():
                 with st.expander("⚠️ View Error Log", expanded=False):
-                    for msg in error_messages:
+                    for msg in all_errors:
                         st.warning(msg)
+        else:
+            errors_slot.empty()
 
-            st.subheader("🔍 Full Exchange Metrics")
-            st.dataframe(df.sort_values(by=['Pair', 'Exchange']), use_container_width=True)
-            price_df = df.dropna(subset=['Price'])
+        health_slot.dataframe(exchange_health(), use_container_width=True, hide_index=True)
+        stages = METRICS.stage_summary()
+        if stages:
+            stages_slot.caption(" · ".join(f"{stage}: {seconds * 1000:.0f} ms avg" for stage, seconds in sorted(stages.items())))
 
-            volume_df = df.dropna(subset=["Volume (24h)"])
-            change_df = df.dropna(subset=["% Change"])
-            spread_df = df.copy()
-            spread_df["Spread"] = spread_df["Ask"] - spread_df["Bid"]
-            spread_df = spread_df.dropna(subset=["Spread"])
+        if df.empty:
+            table_slot.info("Waiting for the first ticker data...")
+            continue
 
-            st.subheader("💸 Price Per Coin")
-            display_charts_grid(price_df, "Price", "Price", "Last Price")
+        table_slot.dataframe(df.sort_values(by=['Pair', 'Exchange']), use_container_width=True)
 
-            st.subheader("📊 24h Trading Volume")
-            display_charts_grid(volume_df, "Volume (24h)", "24h Volume", "Volume", log_y=True)
+        price_chart.render(df)
+        volume_chart.render(df)
+        change_chart.render(df)
+        spread_chart.render(df)
 
-            st.subheader("📈 24h % Change")
-            display_charts_grid(change_df, "% Change", "% Change", "% Change")
+        opportunities = arbitrage.top_opportunities(df, poller.exchanges)
+        arb_slot.dataframe(
+            opportunities.style.format({"Ask": "{:.6g}", "Bid": "{:.6g}", "Gross (bps)": "{:.1f}", "Net (bps)": "{:.1f}"}),
+            use_container_width=True,
+            hide_index=True,
+        )
 
-            st.subheader("🔎 Bid-Ask Spread")
-            display_charts_grid(spread_df, "Spread", "Spread", "Ask - Bid")
+        if show_depth:
+            depth_df = orderbooks.metrics_frame()
+            if depth_df.empty:
+                depth_slot.info("Waiting for order books...")
+            else:
+                depth_slot.dataframe(depth_df, use_container_width=True, hide_index=True)
 
-            st.subheader("⏱ Data Freshness (Age in Seconds)")
-            fresh_df = df.copy()
-            fresh_df["Data Age (sec)"] = (datetime.utcnow() - fresh_df["Timestamp"]).dt.total_seconds().round()
-            fresh_df = fresh_df.dropna(subset=["Data Age (sec)"])
-
-            fig_fresh = px.density_heatmap(
-                fresh_df,
+        fresh_df = df.dropna(subset=["Data Age (sec)"])
+        fresh_chart.update(
+            data_fingerprint(fresh_df, ["Exchange", "Pair", "Data Age (sec)"]),
+            lambda: px.density_heatmap(
+                fresh_df.astype({"Exchange": str, "Pair": str}),
                 x="Exchange",
                 y="Pair",
                 z="Data Age (sec)",
                 color_continuous_scale="reds",
                 title="Freshness of Broker Data (lower is better)",
                 labels={"Data Age (sec)": "Age (s)"},
+            ),
+        )
+
+        since = datetime.utcnow() - pd.Timedelta(minutes=HISTORY_WINDOWS[history_window])
+        hist_df = history.window(start=since, pair=history_pair, include_archive=bool(HISTORY_ARCHIVE_DIR))
+        hist_df["Spread"] = hist_df["Ask"] - hist_df["Bid"]
+        hist_df["Time (UTC+3)"] = hist_df["Time"] + pd.Timedelta(hours=3)
+        hist_df = hist_df.dropna(subset=[history_metric])
+        history_chart.update(
+            data_fingerprint(hist_df, ["Time", "Exchange", history_metric]),
+            lambda: None if hist_df.empty else px.line(
+                hist_df,
+                x="Time (UTC+3)",
+                y=history_metric,
+                color="Exchange",
+                labels={"Spread": "Ask - Bid", "Price": "Last Price"},
+            ),
+        )
+
+        rendered_at = time.time()
+        latency = update_latency_ms(df, rendered_at, last_render)
+        if latency is not None:
+            latency_slot.caption(
+                f"Update-to-render latency: median {latency.median():.0f} ms, "
+                f"max {latency.max():.0f} ms over {len(latency)} updated rows"
             )
-            st.plotly_chart(fig_fresh, use_container_width=True)
+        last_render = rendered_at
 
         if not autorefresh:
             break
-        time.sleep(60)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,77 @@
+import hashlib
+import math
+
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+
+NUM_COLS = 3                  # facets per row, as in the old per-coin grid
+FACET_ROW_HEIGHT = 320        # px per row of facets
+
+
+def data_fingerprint(df, columns):
+    # Cheap content hash of the plotted columns, used to skip unchanged redraws.
+    if df.empty:
+        return "empty"
+    hashed = pd.util.hash_pandas_object(df[columns], index=False)
+    return hashlib.sha1(hashed.to_numpy().tobytes()).hexdigest()
+
+
+def faceted_bar(df, y_col, y_label, log_y=False):
+    # One figure per metric with one facet per pair, replacing NUM_COLS-wide
+    # grids of per-coin figures. Each facet keeps its own y range.
+    data = df[["Exchange", "Pair", y_col]].dropna(subset=[y_col]).astype({"Exchange": str, "Pair": str})
+    rows = max(1, math.ceil(data["Pair"].nunique() / NUM_COLS))
+    fig = px.bar(
+        data,
+        x="Exchange",
+        y=y_col,
+        color="Exchange",
+        facet_col="Pair",
+        facet_col_wrap=NUM_COLS,
+        facet_row_spacing=min(0.15, 0.6 / rows),
+        labels={y_col: y_label},
+        log_y=log_y,
+        height=FACET_ROW_HEIGHT * rows,
+    )
+    fig.update_yaxes(matches=None, showticklabels=True)
+    fig.update_xaxes(showticklabels=True)
+    fig.for_each_annotation(lambda a: a.update(text=a.text.split("=", 1)[-1]))
+    return fig
+
+
+class IncrementalChart:
+    # A fixed slot on the page that only re-sends its figure when the plotted
+    # data changed. `uirevision` keeps zoom and legend state across updates,
+    # and the key only gains a revision suffix because Streamlit rejects the
+    # same key twice within one long-running script run.
+    def __init__(self, name):
+        self.name = name
+        self.slot = st.empty()
+        self.fingerprint = None
+        self.revision = 0
+
+    def update(self, fingerprint, make_figure):
+        if fingerprint == self.fingerprint:
+            return False
+        self.fingerprint = fingerprint
+        self.revision += 1
+        fig = make_figure()
+        if fig is None:
+            self.slot.empty()
+            return True
+        fig.update_layout(uirevision=self.name)
+        self.slot.plotly_chart(fig, use_container_width=True, key=f"chart-{self.name}-{self.revision}")
+        return True
+
+
+class MetricChart(IncrementalChart):
+    def __init__(self, y_col, y_label, log_y=False):
+        super().__init__(y_col)
+        self.y_col = y_col
+        self.y_label = y_label
+        self.log_y = log_y
+
+    def render(self, df):
+        fingerprint = data_fingerprint(df, ["Exchange", "Pair", self.y_col])
+        return self.update(fingerprint, lambda: faceted_bar(df, self.y_col, self.y_label, self.log_y))
@@ -0,0 +1,611 @@
+import argparse
+import functools
+import heapq
+import io
+import itertools
+import json
+import math
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import ccxt
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import arbitrage
+import markets_cache
+from health import HALF_OPEN, OPEN, CircuitOpenError, HealthTracker, LastGoodTickers
+from history import TickerHistory
+from instrumentation import METRICS, serve_metrics
+from snapshot import build_snapshot
+from symbols import TOP_N_PAIRS, SymbolIndex, canonical_pair
+
+EXCHANGES = ['binance', 'coinbase', 'kraken', 'bitfinex', 'kucoin']
+TOP_COINS = ['BTC/USDT', 'ETH/USDT', 'BNB/USDT', 'SOL/USDT', 'XRP/USDT']
+
+MAX_WORKERS = 32
+CALL_TIMEOUT_MS = 10000       # per-request deadline handed to ccxt
+REFRESH_DEADLINE_SEC = 20     # hard cap on one fetch_all_metrics pass
+POLL_INTERVAL_SEC = 60        # one shared refresh per interval for every viewer
+BATCH_TICKERS = True          # use one fetch_tickers request per exchange where supported
+TICKERS_BATCH_SIZE = 100      # max symbols per fetch_tickers request
+SNAPSHOT_SOURCE = os.getenv("SNAPSHOT_SOURCE")  # collector output to read instead of polling: a file path or tcp://host:port
+READ_POLL_SEC = 0.05          # how often a reader checks the snapshot file for a new version
+READ_TIMEOUT_SEC = 5          # socket reads and connects give up after this long
+SEND_TIMEOUT_SEC = 1          # a socket reader that cannot take a frame this fast is dropped
+
+# Process-wide log for load/refresh-of-markets problems; bounded and append-only,
+# so sessions can read it while background threads write.
+error_messages = deque(maxlen=100)
+
+def load_exchange(ex, exchange=None, cache_dir=markets_cache.MARKETS_CACHE_DIR):
+    # Serve markets from the on-disk cache when it verifies; only a miss costs
+    # a load_markets round trip. Expired entries are refreshed in the background.
+    if exchange is None:
+        exchange = getattr(ccxt, ex)({'timeout': CALL_TIMEOUT_MS})
+    if markets_cache.apply_cached_markets(ex, exchange, cache_dir) is None:
+        exchange.load_markets()
+        markets_cache.save_markets(ex, exchange, cache_dir)
+    return exchange
+
+def load_exchanges():
+    exchange_objects = {}
+    with ThreadPoolExecutor(max_workers=len(EXCHANGES)) as pool:
+        futures = {ex: pool.submit(load_exchange, ex) for ex in EXCHANGES}
+    for ex, future in futures.items():
+        try:
+            exchange_objects[ex] = future.result()
+        except Exception as e:
+            error_messages.append(f"[ERROR] Could not load {ex}: {e}")
+    markets_cache.MarketsRefresher(exchange_objects, error_log=error_messages).start()
+    return exchange_objects
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="ticker")
+_rate_locks = {}
+_next_slot = {}
+_in_flight = {}               # exchange -> calls handed to the pool and not finished yet
+_deferred = {}                # exchange -> {pair: passes in a row it got no request slot}, longest wait asked for first
+_in_flight_lock = threading.Lock()
+
+def reserve_slot(ex_name, ex, latest=math.inf):
+    # Reserve the next request slot on this exchange, spaced by the
+    # exchange's own rateLimit (ms between requests), and return its time on
+    # the monotonic clock. Nothing is reserved, and None returned, when that
+    # slot would fall after `latest`.
+    lock = _rate_locks.setdefault(ex_name, threading.Lock())
+    with lock:
+        now = time.monotonic()
+        slot = max(now, _next_slot.get(ex_name, now))
+        if slot > latest:
+            return None
+        _next_slot[ex_name] = slot + ex.rateLimit / 1000
+    return slot
+
+def wait_for_rate_limit(ex_name, ex):
+    delay = reserve_slot(ex_name, ex) - time.monotonic()
+    if delay > 0:
+        time.sleep(delay)
+
+def _call_finished(ex_name):
+    with _in_flight_lock:
+        _in_flight[ex_name] -= 1
+
+def submit_call(ex_name, fn, *args):
+    # Hands a call on this exchange to the worker pool, counting it in flight
+    # until it finishes (or is cancelled before it started).
+    with _in_flight_lock:
+        _in_flight[ex_name] = _in_flight.get(ex_name, 0) + 1
+    future = _executor.submit(fn, *args)
+    future.add_done_callback(lambda _: _call_finished(ex_name))
+    return future
+
+def in_flight(ex_name):
+    with _in_flight_lock:
+        return _in_flight.get(ex_name, 0)
+
+HEALTH = HealthTracker(max_timeout_ms=CALL_TIMEOUT_MS)
+LAST_GOOD = LastGoodTickers()
+
+class CollectionPass:
+    # The calls of one collect_tickers pass. Each call's outcome is settled
+    # exactly once, by whichever side reports first: the worker when the call
+    # returns, or the collector when the pass deadline passes before that.
+    def __init__(self, deadline):
+        self.started = time.monotonic()
+        self.ends = self.started + deadline
+        self._calls = itertools.count()
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def new_call(self):
+        return next(self._calls)
+
+    def settle(self, call, owner):
+        # True if `owner` settles the call (again, for the same owner).
+        with self._lock:
+            return self._owners.setdefault(call, owner) == owner
+
+def guarded_call(health, ex_name, ex, method, pair, fn, *args, settle=None):
+    # Each call gets the exchange's current adaptive timeout, and its outcome
+    # feeds that exchange's circuit breaker. Queued calls to an exchange whose
+    # circuit opened meanwhile are dropped without a request. A call whose pass
+    # already counted it as timed out does not report again: a late success
+    # would otherwise reset the failures of a venue that never beats the deadline.
+    if health.state(ex_name) == OPEN:
+        raise CircuitOpenError(f"circuit open for another {health.retry_in(ex_name):.0f}s")
+    ex.timeout = health.timeout_ms(ex_name)
+    started = time.perf_counter()
+    try:
+        result = METRICS.timed_call(ex_name, method, pair, fn, *args, settle=settle)
+    except Exception as e:
+        if settle is None or settle():
+            health.record_failure(ex_name, e)
+        raise
+    if settle is None or settle():
+        health.record_success(ex_name, time.perf_counter() - started)
+    return result
+
+def fetch_ticker_one(ex_name, ex, coin, health=HEALTH, settle=None):
+    return guarded_call(health, ex_name, ex, 'fetch_ticker', coin, ex.fetch_ticker, coin, settle=settle)
+
+def fetch_tickers_batch(ex_name, ex, coins, health=HEALTH, settle=None):
+    tickers = guarded_call(health, ex_name, ex, 'fetch_tickers', '*', ex.fetch_tickers, coins, settle=settle)
+    return {coin: tickers[coin] for coin in coins if tickers.get(coin)}
+
+def fetch_all_tickers(ex_name, ex, health=HEALTH):
+    wait_for_rate_limit(ex_name, ex)
+    return guarded_call(health, ex_name, ex, 'fetch_tickers', '*', ex.fetch_tickers)
+
+def supports_batch(ex):
+    return BATCH_TICKERS and bool(ex.has.get('fetchTickers'))
+
+def collect_tickers(exchanges, coins, deadline=REFRESH_DEADLINE_SEC, error_log=None, health=None, symbols=None):
+    # Each request is handed to the worker pool when its exchange's next
+    # rate-limit slot comes up, so workers never sit out a rate-limit wait and
+    # a request that could not finish before the deadline is never made. Each
+    # exchange is throttled independently, so a slow venue only delays its
+    # own rows, and the whole pass is cut off at the deadline. A venue whose
+    # next slot comes too late (its rateLimit is longer than the pass) is left
+    # for a later pass; its rows are served stale meanwhile. Pairs that got no
+    # slot are logged and go to the head of the exchange's next pass, so a
+    # rateLimit too slow for every pair in one pass rotates through them
+    # instead of always dropping the same tail.
+    # Exchanges that can return many tickers in one request get one
+    # fetch_tickers call per batch, and only the symbols a batch failed to
+    # return are retried one by one. Exchanges with an open circuit, or still
+    # running a call abandoned by an earlier pass, are skipped; a half-open
+    # one gets a single probe request. With a SymbolIndex, `coins` are
+    # canonical pairs requested under each exchange's own symbol, and pairs
+    # an exchange does not list are skipped quietly.
+    if error_log is None:
+        error_log = error_messages
+    if health is None:
+        health = HEALTH
+    pass_ = CollectionPass(deadline)
+    results = {}
+    errors = {}
+    queued = []     # heap of (slot, order, exchange, ex, method, [(pair, exchange symbol)])
+    running = {}    # future -> (exchange, ex, method, [(pair, exchange symbol)], call)
+    order = itertools.count()
+    unslotted = {}  # exchange -> {pair: passes in a row without a slot, this one included}
+    waited = {}     # exchange -> the same count as of the previous pass
+
+    def no_slot(ex_name, ex, listed):
+        for coin, _ in listed:
+            unslotted.setdefault(ex_name, {})[coin] = waited.get(ex_name, {}).get(coin, 0) + 1
+        for coin, _ in listed:
+            errors[(ex_name, coin)] = (f"no request slot before the {deadline}s deadline "
+                                       f"(rateLimit {ex.rateLimit:g} ms), asked for first next pass")
+
+    def schedule(ex_name, ex, method, listed):
+        # Only slots that leave the call its usual duration before the deadline.
+        slot = reserve_slot(ex_name, ex, pass_.ends - health.expected_seconds(ex_name))
+        if slot is None:
+            no_slot(ex_name, ex, listed)
+        else:
+            heapq.heappush(queued, (slot, next(order), ex_name, ex, method, listed))
+
+    def submit(ex_name, ex, method, listed):
+        call = pass_.new_call()
+        settle = functools.partial(pass_.settle, call, 'worker')
+        if method == 'fetch_tickers':
+            future = submit_call(ex_name, fetch_tickers_batch, ex_name, ex, [symbol for _, symbol in listed],
+                                 health, settle)
+        else:
+            future = submit_call(ex_name, fetch_ticker_one, ex_name, ex, listed[0][1], health, settle)
+        running[future] = (ex_name, ex, method, listed, call)
+
+    for ex_name, ex in exchanges.items():
+        listed = []    # (pair, exchange symbol)
+        for coin in coins:
+            symbol = coin if symbols is None else symbols.symbol(ex_name, coin)
+            if symbol is None:
+                continue
+            if ex.markets and symbol not in ex.markets:
+                errors[(ex_name, coin)] = f"{symbol} is not listed on {ex_name}"
+            else:
+                listed.append((coin, symbol))
+        circuit = health.state(ex_name)
+        if circuit == OPEN:
+            error_log.append(f"[ERROR] {ex_name} skipped, circuit open for another "
+                             f"{health.retry_in(ex_name):.0f}s")
+            continue
+        if listed and in_flight(ex_name):
+            error_log.append(f"[ERROR] {ex_name} skipped, a request from an earlier pass is still running")
+            continue
+        # Pairs that have waited longest for a slot go first (the sort is stable).
+        waited[ex_name] = _deferred.pop(ex_name, {})
+        listed.sort(key=lambda item: -waited[ex_name].get(item[0], 0))
+        unslotted[ex_name] = {}
+        if circuit == HALF_OPEN and listed:
+            health.start_probe(ex_name)
+            listed = listed[:TICKERS_BATCH_SIZE] if supports_batch(ex) else listed[:1]
+        if supports_batch(ex):
+            for i in range(0, len(listed), TICKERS_BATCH_SIZE):
+                schedule(ex_name, ex, 'fetch_tickers', listed[i:i + TICKERS_BATCH_SIZE])
+        else:
+            for coin, symbol in listed:
+                schedule(ex_name, ex, 'fetch_ticker', [(coin, symbol)])
+
+    # Fallbacks are queued as soon as their batch returns rather than after
+    # the slowest one, so they share the same deadline as everything else.
+    while queued or running:
+        now = time.monotonic()
+        if now >= pass_.ends:
+            break
+        while queued and queued[0][0] <= now:
+            _, _, ex_name, ex, method, listed = heapq.heappop(queued)
+            submit(ex_name, ex, method, listed)
+        wake = min(queued[0][0], pass_.ends) if queued else pass_.ends
+        if not running:
+            time.sleep(max(0, wake - now))
+            continue
+        done, _ = wait(running, timeout=max(0, wake - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            ex_name, ex, method, listed, _ = running.pop(future)
+            try:
+                tickers = future.result()
+            except Exception as e:
+                for coin, _ in listed:
+                    errors[(ex_name, coin)] = e
+                tickers = {}
+            if method == 'fetch_ticker':
+                if tickers:
+                    results[(ex_name, listed[0][0])] = tickers
+                continue
+            circuit_open = health.state(ex_name) == OPEN
+            for coin, symbol in listed:
+                if symbol in tickers:
+                    results[(ex_name, coin)] = tickers[symbol]
+                elif not circuit_open:
+                    schedule(ex_name, ex, 'fetch_ticker', [(coin, symbol)])
+
+    for future, (ex_name, ex, method, listed, call) in running.items():
+        future.cancel()
+        if pass_.settle(call, 'deadline'):
+            METRICS.observe_call(ex_name, method, '*' if method == 'fetch_tickers' else listed[0][1], None, "timeout")
+            health.record_failure(ex_name)
+        for coin, _ in listed:
+            errors[(ex_name, coin)] = f"no response within {deadline}s"
+    for _, _, ex_name, ex, _, listed in queued:
+        no_slot(ex_name, ex, listed)
+    _deferred.update(unslotted)
+
+    for coin in coins:
+        for ex_name in exchanges:
+            key = (ex_name, coin)
+            if key not in results and key in errors:
+                error_log.append(f"[ERROR] {ex_name} - {coin}: {errors[key]}")
+    error_log.extend(health.drain_events())
+    return results
+
+def fetch_market_volumes(exchanges, deadline=REFRESH_DEADLINE_SEC, error_log=None):
+    # Quote volume of every market, one unfiltered fetch_tickers call per
+    # exchange that supports it, for ranking the symbol index.
+    if error_log is None:
+        error_log = error_messages
+    futures = {submit_call(ex_name, fetch_all_tickers, ex_name, ex): ex_name
+               for ex_name, ex in exchanges.items() if ex.has.get('fetchTickers')}
+    done, _ = wait(futures, timeout=deadline)
+    volumes = {}
+    for future, ex_name in futures.items():
+        if future not in done:
+            future.cancel()
+            error_log.append(f"[ERROR] {ex_name} volumes: no response within {deadline}s")
+            continue
+        try:
+            tickers = future.result()
+        except Exception as e:
+            error_log.append(f"[ERROR] {ex_name} volumes: {e}")
+            continue
+        for symbol, ticker in tickers.items():
+            volume = ticker.get('quoteVolume')
+            if volume is None and ticker.get('baseVolume') is not None and ticker.get('last') is not None:
+                volume = ticker['baseVolume'] * ticker['last']
+            volumes[(ex_name, symbol)] = volume or 0.0
+    return volumes
+
+def build_symbol_index(exchanges, top_n=TOP_N_PAIRS, error_log=None):
+    # Without any volumes the old hardcoded pairs lead the ranking.
+    volumes = fetch_market_volumes(exchanges, error_log=error_log)
+    pinned = [] if volumes else [canonical_pair(coin.split('/')[0]) for coin in TOP_COINS]
+    return SymbolIndex(exchanges, volumes, top_n=top_n, pinned=pinned)
+
+def fetch_all_metrics(exchanges, coins, deadline=REFRESH_DEADLINE_SEC, error_log=None, symbols=None):
+    # Rows a skipped or failing exchange did not deliver this pass are served
+    # from its last good ticker and flagged in the Stale column.
+    started = time.perf_counter()
+    tickers = collect_tickers(exchanges, coins, deadline=deadline, error_log=error_log, symbols=symbols)
+    METRICS.observe_stage('collect', time.perf_counter() - started)
+    LAST_GOOD.update(tickers)
+    stale = LAST_GOOD.fill(tickers, [(ex_name, coin) for coin in coins for ex_name in exchanges])
+    started = time.perf_counter()
+    df = build_snapshot(tickers, exchanges, coins, stale=stale, symbols=symbols)
+    METRICS.observe_stage('snapshot_build', time.perf_counter() - started)
+    return df
+
+class SnapshotPoller:
+    # One background thread per server process refreshes the tickers and
+    # publishes the latest snapshot; every browser session just waits for a
+    # newer version, so exchange traffic does not grow with the audience.
+    def __init__(self, exchanges, coins, interval=POLL_INTERVAL_SEC, history=None, deadline=REFRESH_DEADLINE_SEC,
+                 top_n=None):
+        # With top_n set, `coins` is ignored: the pairs come from a SymbolIndex
+        # that is rebuilt whenever the exchanges' markets are reloaded.
+        self.exchanges = exchanges
+        self.coins = coins
+        self.interval = interval
+        self.deadline = deadline
+        self.top_n = top_n
+        self.symbols = None
+        self.history = history
+        self.version = 0
+        self.df = pd.DataFrame()
+        self.errors = []
+        self.updated_at = None
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="ticker-poller", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            errors = []
+            try:
+                df = self.collect(errors)
+            except Exception as e:
+                df = pd.DataFrame()
+                errors.append(f"[ERROR] Refresh failed: {e}")
+            if df is None:
+                time.sleep(self.interval)
+                continue
+            METRICS.observe_stage('refresh', time.monotonic() - started)
+            with self._cond:
+                self.df = df
+                self.errors = errors
+                self.updated_at = datetime.utcnow()
+                self.version += 1
+                self._cond.notify_all()
+            if self.history is not None:
+                try:
+                    self.history.append(df)
+                except Exception as e:
+                    errors.append(f"[ERROR] History update failed: {e}")
+            time.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+    def collect(self, errors):
+        if self.top_n and (self.symbols is None or self.symbols.outdated(self.exchanges)):
+            self.symbols = build_symbol_index(self.exchanges, self.top_n, error_log=errors)
+            self.coins = self.symbols.pairs
+        return fetch_all_metrics(self.exchanges, self.coins, deadline=self.deadline, error_log=errors,
+                                 symbols=self.symbols)
+
+    def latest(self, seen_version=0, timeout=None):
+        # Block until there is a snapshot newer than seen_version (or timeout).
+        with self._cond:
+            self._cond.wait_for(lambda: self.version > seen_version, timeout=timeout)
+            return self.version, self.df, self.errors, self.updated_at
+
+
+# Snapshot wire format, for files and socket frames alike: one Parquet
+# payload whose schema metadata carries the version, publish time, the
+# pass's errors and the taker fees the arbitrage table needs.
+
+def encode_snapshot(df, version, updated_at, errors, exchanges):
+    # Fees are keyed by the market each row was quoted on (its Symbol), as
+    # arbitrage.spread_matrix looks them up.
+    fees = {}
+    if not df.empty:
+        for ex_name, symbol in set(zip(df['Exchange'].astype(str), arbitrage.market_symbols(df))):
+            if ex_name in exchanges:
+                fees.setdefault(ex_name, {})[symbol] = arbitrage.taker_fee(exchanges[ex_name], symbol)
+    meta = {
+        'version': version,
+        'updated_at': updated_at.isoformat(),
+        'errors': [str(msg) for msg in errors],
+        'fees': fees,
+    }
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'snapshot': json.dumps(meta).encode('utf-8')})
+    buf = io.BytesIO()
+    pq.write_table(table, buf)
+    return buf.getvalue()
+
+def decode_snapshot(payload):
+    table = pq.read_table(io.BytesIO(payload))
+    meta = json.loads(table.schema.metadata[b'snapshot'])
+    meta['updated_at'] = datetime.fromisoformat(meta['updated_at'])
+    return table.to_pandas(), meta
+
+def write_snapshot_file(path, payload):
+    # Readers only ever see a complete file.
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+def parse_address(text):
+    host, _, port = text.removeprefix("tcp://").rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+def recv_exact(conn, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = conn.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("collector closed the connection")
+        data += chunk
+    return bytes(data)
+
+class SnapshotServer:
+    # Pushes every snapshot to all connected readers as a length-prefixed
+    # frame; a reader that connects gets the latest one straight away.
+    def __init__(self, host, port):
+        self._sock = socket.create_server((host, port))
+        self.address = self._sock.getsockname()[:2]
+        self._clients = []
+        self._latest = None
+        self._lock = threading.Lock()
+        threading.Thread(target=self._accept, name="snapshot-server", daemon=True).start()
+
+    def _send(self, conn, frame):
+        try:
+            conn.sendall(frame)
+            return True
+        except OSError:
+            conn.close()
+            return False
+
+    def _accept(self):
+        while True:
+            conn, _ = self._sock.accept()
+            conn.settimeout(SEND_TIMEOUT_SEC)
+            with self._lock:
+                if self._latest is None or self._send(conn, self._latest):
+                    self._clients.append(conn)
+
+    def publish(self, payload):
+        frame = struct.pack(">Q", len(payload)) + payload
+        with self._lock:
+            self._latest = frame
+            self._clients = [conn for conn in self._clients if self._send(conn, frame)]
+
+class ExchangeFees:
+    # Just enough of a ccxt exchange for arbitrage.taker_fee on the reader side.
+    def __init__(self, fees):
+        self.markets = {symbol: {'taker': fee} for symbol, fee in fees.items()}
+        self.fees = {}
+
+class SnapshotReader(SnapshotPoller):
+    # Same latest() interface as SnapshotPoller, fed by a collector process
+    # through a snapshot file or a tcp://host:port socket instead of by
+    # calling the exchanges itself.
+    def __init__(self, source, history=None):
+        self.source = source
+        self._conn = None
+        self._seen = None
+        interval = READ_POLL_SEC if not source.startswith("tcp://") else 0
+        super().__init__({}, [], interval=interval, history=history)
+
+    def _read(self):
+        if not self.source.startswith("tcp://"):
+            try:
+                stat = os.stat(self.source)
+            except FileNotFoundError:
+                return None
+            if (stat.st_mtime_ns, stat.st_size) == self._seen:
+                return None
+            self._seen = (stat.st_mtime_ns, stat.st_size)
+            with open(self.source, 'rb') as f:
+                return f.read()
+        try:
+            if self._conn is None:
+                self._conn = socket.create_connection(parse_address(self.source), timeout=READ_TIMEOUT_SEC)
+                self._conn.settimeout(None)
+            (size,) = struct.unpack(">Q", recv_exact(self._conn, 8))
+            return recv_exact(self._conn, size)
+        except OSError as e:
+            # Keep showing the last snapshot while the collector is away; only
+            # the first failure of an outage is logged.
+            if self._conn is not None or self._seen is None:
+                error_messages.append(f"[ERROR] Collector at {self.source} unavailable: {e}")
+                self._seen = "failed"
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            time.sleep(READ_TIMEOUT_SEC / 5)
+            return None
+
+    def collect(self, errors):
+        payload = self._read()
+        if payload is None:
+            return None
+        df, meta = decode_snapshot(payload)
+        errors.extend(meta['errors'])
+        self.exchanges = {ex_name: ExchangeFees(fees) for ex_name, fees in meta['fees'].items()}
+        self.coins = list(df['Pair'].unique()) if not df.empty else []
+        return df
+
+def run_collector(args):
+    exchanges = load_exchanges()
+    history = TickerHistory(archive_dir=args.history_dir) if args.history_dir else None
+    poller = SnapshotPoller(exchanges, args.coins, interval=args.interval, history=history, deadline=args.deadline,
+                            top_n=args.top)
+    server = SnapshotServer(*parse_address(args.listen)) if args.listen else None
+    if server:
+        print(f"serving snapshots on tcp://{server.address[0]}:{server.address[1]}", file=sys.stderr)
+    if args.metrics_port:
+        serve_metrics(port=args.metrics_port)
+
+    version = 0
+    while True:
+        latest_version, df, errors, updated_at = poller.latest(version, timeout=2 * max(args.interval, args.deadline))
+        if latest_version == version:
+            continue
+        version = latest_version
+        started = time.perf_counter()
+        payload = encode_snapshot(df, version, updated_at, list(error_messages) + errors, exchanges)
+        if args.file:
+            write_snapshot_file(args.file, payload)
+        if server:
+            server.publish(payload)
+        METRICS.observe_stage('publish', time.perf_counter() - started)
+        if args.verbose:
+            print(f"v{version} {updated_at:%H:%M:%S.%f} {len(df)} rows, {len(errors)} errors, {len(payload)} bytes",
+                  file=sys.stderr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Collect tickers without Streamlit and publish snapshots for the dashboards "
+                    "(point them at the output with SNAPSHOT_SOURCE).")
+    parser.add_argument("--file", help="write each snapshot to this Parquet file")
+    parser.add_argument("--listen", help="serve snapshots to socket readers on host:port")
+    parser.add_argument("--interval", type=float, default=1.0,
+                        help="seconds between collection passes; each exchange is still asked at most once per its "
+                             "ccxt rateLimit, and serves stale rows in passes that fall in between")
+    parser.add_argument("--deadline", type=float, default=None, help="cap on one pass (default: the interval, at least 1s)")
+    parser.add_argument("--exchanges", default=",".join(EXCHANGES))
+    parser.add_argument("--coins", default=",".join(TOP_COINS), help="fixed pairs to collect when --top is 0")
+    parser.add_argument("--top", type=int, default=TOP_N_PAIRS, help="collect the N highest-volume pairs across exchanges")
+    parser.add_argument("--history-dir", help="also archive every snapshot to Parquet parts here")
+    parser.add_argument("--metrics-port", type=int, help="serve /metrics on this port")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    if not args.file and not args.listen:
+        parser.error("give --file, --listen or both")
+    EXCHANGES = [name for name in args.exchanges.split(",") if name]
+    args.coins = [coin for coin in args.coins.split(",") if coin]
+    if args.deadline is None:
+        args.deadline = max(1.0, args.interval)
+    try:
+        run_collector(args)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,182 @@
+import threading
+import time
+
+import ccxt
+import pandas as pd
+
+MIN_CALL_TIMEOUT_MS = 1500    # adaptive timeouts never go below this
+MAX_CALL_TIMEOUT_MS = 10000   # ...nor above ccxt's usual default
+TIMEOUT_DEVIATIONS = 4        # timeout = smoothed latency + this many smoothed deviations
+LATENCY_SMOOTHING = 0.125     # weight of each new sample in the smoothed latency
+FAILURE_THRESHOLD = 3         # consecutive failures that open an exchange's circuit
+BASE_BACKOFF_SEC = 15         # first open period; doubles each time a probe fails
+MAX_BACKOFF_SEC = 600
+LAST_GOOD_MAX_AGE_SEC = 900   # last-known-good rows older than this are dropped, not served
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def counts_as_failure(error):
+    # Only transport-level trouble says something about the venue's health; a
+    # delisted symbol or a bad request does not.
+    return error is None or isinstance(error, ccxt.NetworkError)
+
+
+class ExchangeHealth:
+    def __init__(self, max_timeout_ms=MAX_CALL_TIMEOUT_MS):
+        self.max_timeout_ms = max_timeout_ms
+        self.latency = None         # smoothed seconds, None until the first success
+        self.deviation = 0.0
+        self.failures = 0           # consecutive
+        self.opened = 0             # consecutive open periods, drives the backoff
+        self.open_until = 0.0
+        self.probing = False
+
+    def state(self, now):
+        if self.open_until > now:
+            return OPEN
+        if self.opened:
+            return HALF_OPEN
+        return CLOSED
+
+    def timeout_ms(self):
+        # Same shape as TCP's retransmission timeout: a venue that usually answers
+        # in 200 ms is not given ccxt's full default before a call counts as lost.
+        if self.latency is None:
+            return self.max_timeout_ms
+        timeout = (self.latency + TIMEOUT_DEVIATIONS * self.deviation) * 1000
+        return int(min(self.max_timeout_ms, max(MIN_CALL_TIMEOUT_MS, timeout)))
+
+    def record_success(self, seconds):
+        if self.latency is None:
+            self.latency = seconds
+            self.deviation = seconds / 2
+        else:
+            self.deviation += LATENCY_SMOOTHING * (abs(seconds - self.latency) - self.deviation)
+            self.latency += LATENCY_SMOOTHING * (seconds - self.latency)
+        self.failures = 0
+        self.opened = 0
+        self.open_until = 0.0
+        self.probing = False
+
+    def record_failure(self, now):
+        # Returns the open period in seconds when this failure opened the circuit.
+        # Calls that were already in flight when it opened do not extend it.
+        if self.open_until > now:
+            return None
+        self.failures += 1
+        if self.probing or self.failures >= FAILURE_THRESHOLD:
+            backoff = min(MAX_BACKOFF_SEC, BASE_BACKOFF_SEC * 2 ** self.opened)
+            self.opened += 1
+            self.open_until = now + backoff
+            self.failures = 0
+            self.probing = False
+            return backoff
+        return None
+
+
+class HealthTracker:
+    # Per-exchange circuit breakers with adaptive call timeouts. A venue whose
+    # circuit is open gets no requests at all; once the backoff runs out a
+    # single probe request decides whether it closes again or stays open for
+    # twice as long.
+    def __init__(self, max_timeout_ms=MAX_CALL_TIMEOUT_MS):
+        self.max_timeout_ms = max_timeout_ms
+        self.exchanges = {}
+        self.events = []            # circuit transitions since the last drain_events()
+        self._lock = threading.Lock()
+
+    def _health(self, ex_name):
+        if ex_name not in self.exchanges:
+            self.exchanges[ex_name] = ExchangeHealth(self.max_timeout_ms)
+        return self.exchanges[ex_name]
+
+    def state(self, ex_name):
+        with self._lock:
+            return self._health(ex_name).state(time.monotonic())
+
+    def start_probe(self, ex_name):
+        with self._lock:
+            self._health(ex_name).probing = True
+
+    def retry_in(self, ex_name):
+        with self._lock:
+            return max(0.0, self._health(ex_name).open_until - time.monotonic())
+
+    def timeout_ms(self, ex_name):
+        with self._lock:
+            return self._health(ex_name).timeout_ms()
+
+    def expected_seconds(self, ex_name):
+        # Typical call duration (smoothed latency plus one deviation), 0 until
+        # the first success.
+        with self._lock:
+            health = self._health(ex_name)
+            return health.latency + health.deviation if health.latency is not None else 0.0
+
+    def record_success(self, ex_name, seconds):
+        with self._lock:
+            health = self._health(ex_name)
+            if health.opened:
+                self.events.append(f"[INFO] {ex_name} recovered, circuit closed")
+            health.record_success(seconds)
+
+    def record_failure(self, ex_name, error=None):
+        if not counts_as_failure(error):
+            return
+        with self._lock:
+            backoff = self._health(ex_name).record_failure(time.monotonic())
+            if backoff is not None:
+                self.events.append(f"[ERROR] {ex_name} circuit open for {backoff:.0f}s after repeated failures")
+
+    def drain_events(self):
+        with self._lock:
+            events, self.events = self.events, []
+            return events
+
+    def summary(self):
+        now = time.monotonic()
+        with self._lock:
+            rows = [{
+                'Exchange': ex_name,
+                'Circuit': health.state(now),
+                'Timeout (ms)': health.timeout_ms(),
+                'Retry in (s)': round(max(0.0, health.open_until - now)),
+            } for ex_name, health in sorted(self.exchanges.items())]
+        return pd.DataFrame(rows)
+
+
+class LastGoodTickers:
+    # Most recent successful ticker per (exchange, pair), used to keep rows on
+    # screen, marked stale, while their venue is skipped or failing.
+    def __init__(self, max_age=LAST_GOOD_MAX_AGE_SEC):
+        self.max_age = max_age
+        self.tickers = {}
+        self._lock = threading.Lock()
+
+    def update(self, tickers):
+        now = time.monotonic()
+        with self._lock:
+            for key, ticker in tickers.items():
+                self.tickers[key] = (now, ticker)
+
+    def fill(self, tickers, keys):
+        # Adds remembered tickers for the keys missing from `tickers` and
+        # returns the set of keys it filled.
+        now = time.monotonic()
+        stale = set()
+        with self._lock:
+            for key in keys:
+                if key in tickers or key not in self.tickers:
+                    continue
+                stored_at, ticker = self.tickers[key]
+                if now - stored_at <= self.max_age:
+                    tickers[key] = ticker
+                    stale.add(key)
+        return stale
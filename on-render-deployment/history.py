@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+HISTORY_FIELDS = ['Price', 'Bid', 'Ask', 'Volume (24h)', '% Change']
+HISTORY_CAPACITY = 1440       # samples kept in memory per exchange/pair
+HISTORY_MAX_SERIES = 256      # exchange/pair series kept in memory
+HISTORY_FLUSH_SEC = 300       # how often new samples are appended to the archive
+
+
+class TickerHistory:
+    # Fixed-size ring buffer of snapshots. Each field is one float64 array of
+    # shape (series, capacity) and each exchange/pair owns a row, so memory is
+    # bounded by HISTORY_MAX_SERIES x HISTORY_CAPACITY x fields regardless of
+    # uptime. Samples are periodically appended to Parquet part files under
+    # `archive_dir`, which `window(..., include_archive=True)` reads back.
+    def __init__(self, capacity=HISTORY_CAPACITY, max_series=HISTORY_MAX_SERIES,
+                 fields=HISTORY_FIELDS, archive_dir=None, flush_every=HISTORY_FLUSH_SEC):
+        self.capacity = capacity
+        self.max_series = max_series
+        self.fields = list(fields)
+        self.archive_dir = archive_dir
+        self.flush_every = flush_every
+        self.dropped_samples = 0
+        self._lock = threading.Lock()
+        self._keys = []
+        self._index = {}
+        rows = min(16, max_series)
+        self._times = np.full((rows, capacity), np.nan)
+        self._cols = {field: np.full((rows, capacity), np.nan) for field in self.fields}
+        self._written = np.zeros(rows, dtype=np.int64)   # total samples ever written per series
+        self._flushed = np.zeros(rows, dtype=np.int64)   # of which already archived
+        self._last_flush = time.monotonic()
+        self._flush_seq = 0
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+
+    def nbytes(self):
+        return self._times.nbytes + sum(col.nbytes for col in self._cols.values())
+
+    def _grow(self, rows):
+        extra = rows - self._times.shape[0]
+        pad = np.full((extra, self.capacity), np.nan)
+        self._times = np.vstack([self._times, pad])
+        for field in self.fields:
+            self._cols[field] = np.vstack([self._cols[field], pad])
+        self._written = np.concatenate([self._written, np.zeros(extra, dtype=np.int64)])
+        self._flushed = np.concatenate([self._flushed, np.zeros(extra, dtype=np.int64)])
+
+    def _series_rows(self, keys):
+        rows = np.empty(len(keys), dtype=np.int64)
+        for i, key in enumerate(keys):
+            row = self._index.get(key)
+            if row is None:
+                if len(self._keys) >= self.max_series:
+                    self.dropped_samples += 1
+                    row = -1
+                else:
+                    row = len(self._keys)
+                    if row >= self._times.shape[0]:
+                        self._grow(min(self.max_series, 2 * self._times.shape[0]))
+                    self._index[key] = row
+                    self._keys.append(key)
+            rows[i] = row
+        return rows
+
+    def append(self, df, at=None):
+        if df.empty:
+            return
+        at = time.time() if at is None else at
+        with self._lock:
+            rows = self._series_rows(list(zip(df['Exchange'], df['Pair'])))
+            keep = rows >= 0
+            rows = rows[keep]
+            slots = self._written[rows] % self.capacity
+            self._times[rows, slots] = at
+            for field in self.fields:
+                values = pd.to_numeric(df[field], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+                self._cols[field][rows, slots] = values[keep]
+            self._written[rows] += 1
+        if self.archive_dir and time.monotonic() - self._last_flush >= self.flush_every:
+            self.flush()
+
+    def _collect(self, rows, since_written=None):
+        # Gather the live samples of `rows` into flat arrays, oldest first.
+        rows = np.asarray(rows, dtype=np.int64)
+        written = self._written[rows]
+        ages = np.arange(self.capacity)[None, :]
+        # Slot j of a row holds the sample written `(written - 1 - j) % capacity` writes ago.
+        slots_back = (written[:, None] - 1 - ages) % self.capacity
+        valid = slots_back < np.minimum(written, self.capacity)[:, None]
+        if since_written is not None:
+            valid &= slots_back < (written - since_written)[:, None]
+        r, c = np.nonzero(valid)
+        series = rows[r]
+        order = np.lexsort((self._times[series, c], series))
+        series, c = series[order], c[order]
+        return series, c
+
+    def _frame(self, series, slots):
+        frame = pd.DataFrame({
+            'Time': pd.to_datetime(self._times[series, slots], unit='s'),
+            'Exchange': [self._keys[i][0] for i in series],
+            'Pair': [self._keys[i][1] for i in series],
+        })
+        for field in self.fields:
+            frame[field] = self._cols[field][series, slots]
+        return frame
+
+    def flush(self):
+        # Append every sample written since the last flush as one Parquet part.
+        # Samples overwritten before a flush are lost; size capacity and
+        # flush_every so that flush_every x refresh rate < capacity.
+        if not self.archive_dir:
+            return None
+        with self._lock:
+            rows = np.arange(len(self._keys))
+            series, slots = self._collect(rows, since_written=self._flushed[rows])
+            frame = self._frame(series, slots)
+            self._flushed[rows] = self._written[rows]
+            self._last_flush = time.monotonic()
+            self._flush_seq += 1
+            seq = self._flush_seq
+        if frame.empty:
+            return None
+        path = os.path.join(self.archive_dir, f"ticker-history-{int(time.time())}-{seq:06d}.parquet")
+        frame.to_parquet(path, index=False)
+        return path
+
+    def window(self, start=None, end=None, exchange=None, pair=None, include_archive=False):
+        # Long-format samples with start <= Time <= end, optionally limited to
+        # one exchange and/or pair. Times are naive UTC like the snapshot's.
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        with self._lock:
+            rows = [row for row, (ex_name, coin) in enumerate(self._keys)
+                    if (exchange is None or ex_name == exchange) and (pair is None or coin == pair)]
+            series, slots = self._collect(rows)
+            frame = self._frame(series, slots)
+        if include_archive and self.archive_dir:
+            frame = pd.concat([self._read_archive(start, end, exchange, pair), frame], ignore_index=True)
+            frame = frame.drop_duplicates(subset=['Time', 'Exchange', 'Pair'], keep='last')
+        mask = np.ones(len(frame), dtype=bool)
+        if start is not None:
+            mask &= (frame['Time'] >= start).to_numpy()
+        if end is not None:
+            mask &= (frame['Time'] <= end).to_numpy()
+        return frame[mask].sort_values(['Time', 'Exchange', 'Pair']).reset_index(drop=True)
+
+    def _read_archive(self, start, end, exchange, pair):
+        parts = sorted(f for f in os.listdir(self.archive_dir) if f.endswith('.parquet'))
+        if not parts:
+            return pd.DataFrame(columns=['Time', 'Exchange', 'Pair'] + self.fields)
+        filters = []
+        if start is not None:
+            filters.append(('Time', '>=', start))
+        if end is not None:
+            filters.append(('Time', '<=', end))
+        if exchange is not None:
+            filters.append(('Exchange', '==', exchange))
+        if pair is not None:
+            filters.append(('Pair', '==', pair))
+        paths = [os.path.join(self.archive_dir, f) for f in parts]
+        return pd.read_parquet(paths, filters=filters or None)
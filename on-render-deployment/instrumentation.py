@@ -0,0 +1,175 @@
+import bisect
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+OUTCOMES = ("success", "error", "timeout")
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation.
+        if not self.count:
+            return math.nan
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return math.inf
+
+
+def _labels(**labels):
+    return ",".join(f'{k}="{str(v)}"' for k, v in labels.items())
+
+
+class MetricsRegistry:
+    # Process-wide call latency histograms and outcome counters per
+    # exchange/method/pair, plus snapshot build and refresh timings. Batched
+    # fetch_tickers calls are recorded with pair="*".
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}          # (exchange, method, pair) -> Histogram of successful call latency
+        self.outcomes = {}       # (exchange, method, pair, outcome) -> count
+        self.stages = {}         # stage name -> Histogram
+        self.started_at = time.time()
+
+    def observe_call(self, exchange, method, pair, seconds, outcome="success"):
+        with self._lock:
+            key = (exchange, method, pair)
+            if seconds is not None:
+                self.calls.setdefault(key, Histogram()).observe(seconds)
+            self.outcomes[key + (outcome,)] = self.outcomes.get(key + (outcome,), 0) + 1
+
+    def observe_stage(self, stage, seconds):
+        with self._lock:
+            self.stages.setdefault(stage, Histogram()).observe(seconds)
+
+    def timed_call(self, exchange, method, pair, fn, *args, settle=None):
+        # With `settle`, the outcome is only recorded when settle() returns
+        # True, so a call already counted as a timeout at its pass deadline is
+        # not counted again when it finally returns.
+        started = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            outcome = "timeout" if "timeout" in type(e).__name__.lower() else "error"
+            if settle is None or settle():
+                self.observe_call(exchange, method, pair, time.perf_counter() - started, outcome)
+            raise
+        if settle is None or settle():
+            self.observe_call(exchange, method, pair, time.perf_counter() - started)
+        return result
+
+    def exchange_summary(self):
+        # One row per exchange for the dashboard sidebar.
+        with self._lock:
+            per_exchange = {}
+            for (exchange, _, _), hist in self.calls.items():
+                merged = per_exchange.setdefault(exchange, {"hist": Histogram(), **{o: 0 for o in OUTCOMES}})
+                for i, n in enumerate(hist.counts):
+                    merged["hist"].counts[i] += n
+                merged["hist"].sum += hist.sum
+                merged["hist"].count += hist.count
+            for (exchange, _, _, outcome), n in self.outcomes.items():
+                merged = per_exchange.setdefault(exchange, {"hist": Histogram(), **{o: 0 for o in OUTCOMES}})
+                merged[outcome] += n
+        rows = []
+        for exchange, data in sorted(per_exchange.items()):
+            hist = data["hist"]
+            rows.append({
+                'Exchange': exchange,
+                'Calls': data["success"] + data["error"] + data["timeout"],
+                'Errors': data["error"],
+                'Timeouts': data["timeout"],
+                'Mean (ms)': hist.sum / hist.count * 1000 if hist.count else math.nan,
+                'p95 (ms) ≤': hist.quantile(0.95) * 1000,
+            })
+        return pd.DataFrame(rows)
+
+    def stage_summary(self):
+        with self._lock:
+            return {stage: hist.sum / hist.count for stage, hist in self.stages.items() if hist.count}
+
+    def render_text(self):
+        # Prometheus text exposition format.
+        lines = [
+            "# HELP broker_call_latency_seconds Latency of exchange API calls.",
+            "# TYPE broker_call_latency_seconds histogram",
+        ]
+        with self._lock:
+            for (exchange, method, pair), hist in sorted(self.calls.items()):
+                labels = _labels(exchange=exchange, method=method, pair=pair)
+                cumulative = 0
+                for bound, n in zip(hist.buckets, hist.counts):
+                    cumulative += n
+                    le = "+Inf" if math.isinf(bound) else repr(bound)
+                    lines.append(f'broker_call_latency_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"broker_call_latency_seconds_sum{{{labels}}} {hist.sum}")
+                lines.append(f"broker_call_latency_seconds_count{{{labels}}} {hist.count}")
+            lines += [
+                "# HELP broker_calls_total Exchange API calls by outcome.",
+                "# TYPE broker_calls_total counter",
+            ]
+            for (exchange, method, pair, outcome), n in sorted(self.outcomes.items()):
+                labels = _labels(exchange=exchange, method=method, pair=pair, outcome=outcome)
+                lines.append(f"broker_calls_total{{{labels}}} {n}")
+            lines += [
+                "# HELP broker_stage_seconds Duration of refresh stages such as snapshot building.",
+                "# TYPE broker_stage_seconds histogram",
+            ]
+            for stage, hist in sorted(self.stages.items()):
+                labels = _labels(stage=stage)
+                cumulative = 0
+                for bound, n in zip(hist.buckets, hist.counts):
+                    cumulative += n
+                    le = "+Inf" if math.isinf(bound) else repr(bound)
+                    lines.append(f'broker_stage_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"broker_stage_seconds_sum{{{labels}}} {hist.sum}")
+                lines.append(f"broker_stage_seconds_count{{{labels}}} {hist.count}")
+        lines.append(f"broker_uptime_seconds {time.time() - self.started_at}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+
+def serve_metrics(registry=METRICS, host=METRICS_HOST, port=METRICS_PORT):
+    # Plain-text /metrics endpoint on a daemon thread for a local scraper.
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
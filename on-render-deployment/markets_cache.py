@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import ccxt
+
+MARKETS_CACHE_DIR = os.getenv("MARKETS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".markets_cache"))
+MARKETS_TTL_SEC = 6 * 60 * 60     # cached markets older than this are refreshed in the background
+REFRESH_CHECK_SEC = 10 * 60       # how often the background refresher looks for expired entries
+
+# A cache file is two lines: a JSON header (exchange, ccxt version, save time,
+# sha256 of the payload) and the JSON payload with markets and currencies.
+# Anything that fails to parse or verify is treated as a miss.
+
+
+def cache_path(ex_name, cache_dir=MARKETS_CACHE_DIR):
+    return os.path.join(cache_dir, f"{ex_name}.json")
+
+
+def save_markets(ex_name, exchange, cache_dir=MARKETS_CACHE_DIR):
+    payload = json.dumps(
+        {"markets": exchange.markets, "currencies": exchange.currencies},
+        separators=(",", ":"),
+        default=str,
+    )
+    header = {
+        "exchange": ex_name,
+        "ccxt_version": ccxt.__version__,
+        "saved_at": time.time(),
+        "sha256": hashlib.sha256(payload.encode("utf-8")).hexdigest(),
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(ex_name, cache_dir)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(json.dumps(header) + "\n")
+        f.write(payload)
+    os.replace(tmp, path)
+
+
+def load_cached_markets(ex_name, cache_dir=MARKETS_CACHE_DIR):
+    # Returns (markets, currencies, age_sec), or None when there is no usable cache.
+    try:
+        with open(cache_path(ex_name, cache_dir), encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            payload = f.read()
+    except (OSError, ValueError):
+        return None
+    if header.get("exchange") != ex_name or header.get("ccxt_version") != ccxt.__version__:
+        return None
+    if hashlib.sha256(payload.encode("utf-8")).hexdigest() != header.get("sha256"):
+        return None
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return None
+    markets = data.get("markets")
+    if not isinstance(markets, dict) or not markets:
+        return None
+    for symbol, market in markets.items():
+        if not isinstance(market, dict) or market.get("symbol") != symbol or not market.get("base") or not market.get("quote"):
+            return None
+    return markets, data.get("currencies") or {}, time.time() - header.get("saved_at", 0)
+
+
+def apply_cached_markets(ex_name, exchange, cache_dir=MARKETS_CACHE_DIR):
+    # Loads markets into `exchange` from the cache; returns the cache age, or None on a miss.
+    cached = load_cached_markets(ex_name, cache_dir)
+    if cached is None:
+        return None
+    markets, currencies, age = cached
+    exchange.set_markets(markets, currencies)
+    return age
+
+
+def refresh_markets(ex_name, exchange, cache_dir=MARKETS_CACHE_DIR):
+    exchange.load_markets(reload=True)
+    save_markets(ex_name, exchange, cache_dir)
+
+
+class MarketsRefresher:
+    # Daemon thread that reloads markets over the network for any exchange whose
+    # cache has expired, then rewrites the cache. Exchanges keep serving their
+    # cached markets until the reload finishes.
+    def __init__(self, exchanges, ttl=MARKETS_TTL_SEC, cache_dir=MARKETS_CACHE_DIR, error_log=None):
+        self.exchanges = exchanges
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.error_log = error_log if error_log is not None else []
+        self._failing = set()
+        self._thread = threading.Thread(target=self._run, name="markets-refresher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _expired(self, ex_name):
+        try:
+            with open(cache_path(ex_name, self.cache_dir), encoding="utf-8") as f:
+                saved_at = json.loads(f.readline()).get("saved_at", 0)
+        except (OSError, ValueError):
+            return True
+        return time.time() - saved_at > self.ttl
+
+    def _run(self):
+        while True:
+            for ex_name, exchange in list(self.exchanges.items()):
+                if not self._expired(ex_name):
+                    continue
+                try:
+                    refresh_markets(ex_name, exchange, self.cache_dir)
+                    self._failing.discard(ex_name)
+                except Exception as e:
+                    # Log a failing venue once, not on every retry.
+                    if ex_name not in self._failing:
+                        self._failing.add(ex_name)
+                        self.error_log.append(f"[ERROR] Could not refresh {ex_name} markets: {e}")
+            time.sleep(REFRESH_CHECK_SEC)
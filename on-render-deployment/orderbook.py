@@ -0,0 +1,341 @@
+import argparse
+import asyncio
+import json
+import math
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+import ccxt.pro as ccxtpro
+import pandas as pd
+
+ORDERBOOK_LEVELS = 100            # levels kept per side
+DEPTH_BPS = (10, 50)              # depth is reported within these distances from mid
+SLIPPAGE_SIZES = (10_000, 100_000)  # quote-currency order sizes for slippage
+RECONNECT_DELAY_SEC = 1
+MAX_RECONNECT_DELAY_SEC = 30
+
+# Replay / record format: one JSON object per line,
+#   {"exchange", "symbol", "type": "snapshot" | "update", "bids": [[price, size], ...],
+#    "asks": [...], "seq": int | null, "t": epoch seconds}
+# A size of 0 in an update removes the level.
+
+
+class BookGapError(Exception):
+    pass
+
+
+class BookSide:
+    # Price levels kept as two parallel sorted lists. Bids are stored under
+    # negated prices so both sides iterate best-first in ascending key order.
+    def __init__(self, is_bid):
+        self.sign = -1.0 if is_bid else 1.0
+        self.keys = []
+        self.sizes = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def clear(self):
+        self.keys = []
+        self.sizes = []
+
+    def set(self, price, size):
+        key = self.sign * price
+        i = bisect_left(self.keys, key)
+        found = i < len(self.keys) and self.keys[i] == key
+        if size <= 0:
+            if found:
+                del self.keys[i]
+                del self.sizes[i]
+        elif found:
+            self.sizes[i] = size
+        else:
+            self.keys.insert(i, key)
+            self.sizes.insert(i, size)
+
+    def truncate(self, levels):
+        del self.keys[levels:]
+        del self.sizes[levels:]
+
+    def best(self):
+        return self.sign * self.keys[0] if self.keys else math.nan
+
+    def levels(self, n=None):
+        n = len(self.keys) if n is None else n
+        return [[self.sign * k, s] for k, s in zip(self.keys[:n], self.sizes[:n])]
+
+    def notional_within(self, limit_price):
+        # Quote notional of all levels at or better than limit_price.
+        total = 0.0
+        for key, size in zip(self.keys, self.sizes):
+            price = self.sign * key
+            if self.sign * price > self.sign * limit_price:
+                break
+            total += price * size
+        return total
+
+    def vwap_for_notional(self, notional):
+        # Average fill price for spending `notional` of quote currency walking the
+        # side best-first; NaN when the book is not deep enough.
+        remaining = notional
+        filled_base = 0.0
+        for key, size in zip(self.keys, self.sizes):
+            price = self.sign * key
+            take = min(remaining, price * size)
+            filled_base += take / price
+            remaining -= take
+            if remaining <= 0:
+                return notional / filled_base
+        return math.nan
+
+
+class L2Book:
+    def __init__(self, levels=ORDERBOOK_LEVELS):
+        self.levels = levels
+        self.bids = BookSide(is_bid=True)
+        self.asks = BookSide(is_bid=False)
+        self.seq = None
+        self.synced = False
+        self.updated_at = None
+        self.updates = 0
+
+    def load_snapshot(self, bids, asks, seq=None):
+        self.bids.clear()
+        self.asks.clear()
+        for price, size, *_ in bids:
+            self.bids.set(float(price), float(size))
+        for price, size, *_ in asks:
+            self.asks.set(float(price), float(size))
+        self._finish(seq)
+        self.synced = True
+
+    def apply_update(self, bids, asks, seq=None):
+        # Applies only the changed levels. A missing sequence number means the
+        # book can no longer be trusted until the next snapshot.
+        if not self.synced:
+            raise BookGapError("no snapshot loaded")
+        if seq is not None and self.seq is not None and seq != self.seq + 1:
+            self.synced = False
+            raise BookGapError(f"expected seq {self.seq + 1}, got {seq}")
+        for price, size, *_ in bids:
+            self.bids.set(float(price), float(size))
+        for price, size, *_ in asks:
+            self.asks.set(float(price), float(size))
+        self._finish(seq)
+
+    def _finish(self, seq):
+        self.bids.truncate(self.levels)
+        self.asks.truncate(self.levels)
+        self.seq = seq
+        self.updated_at = time.time()
+        self.updates += 1
+
+    def mid(self):
+        return (self.bids.best() + self.asks.best()) / 2
+
+    def depth(self, bps):
+        mid = self.mid()
+        if math.isnan(mid):
+            return math.nan, math.nan
+        return (self.bids.notional_within(mid * (1 - bps / 1e4)),
+                self.asks.notional_within(mid * (1 + bps / 1e4)))
+
+    def slippage_bps(self, notional):
+        # Cost versus mid of a market buy and a market sell of `notional` quote.
+        mid = self.mid()
+        if math.isnan(mid):
+            return math.nan, math.nan
+        buy = self.asks.vwap_for_notional(notional)
+        sell = self.bids.vwap_for_notional(notional)
+        return (buy - mid) / mid * 1e4, (mid - sell) / mid * 1e4
+
+
+def level_changes(side, new_levels):
+    # Levels to send to `side` so it matches a fresh top-N list: changed or new
+    # prices, plus zero-size removals for prices inside that range that vanished.
+    if not new_levels:
+        return [[price, 0] for price, _ in side.levels()]
+    current = {price: size for price, size in side.levels()}
+    fresh = {float(price): float(size) for price, size, *_ in new_levels}
+    worst = side.sign * max(side.sign * price for price in fresh)
+    changes = [[price, size] for price, size in fresh.items() if current.get(price) != size]
+    changes += [[price, 0] for price in current
+                if price not in fresh and side.sign * price <= side.sign * worst]
+    return changes
+
+
+class OrderBookManager:
+    # One L2Book per (exchange, pair), fed either by the live collector or by a
+    # recorded update file. After a sequence gap a book is hidden until the
+    # next snapshot instead of serving corrupted levels.
+    def __init__(self, levels=ORDERBOOK_LEVELS):
+        self.levels = levels
+        self.books = {}
+        self.gaps = 0
+        self.errors = deque(maxlen=50)
+        self._lock = threading.Lock()
+
+    def book(self, ex_name, pair):
+        key = (ex_name, pair)
+        if key not in self.books:
+            self.books[key] = L2Book(self.levels)
+        return self.books[key]
+
+    def apply_message(self, msg):
+        with self._lock:
+            book = self.book(msg["exchange"], msg["symbol"])
+            if msg["type"] == "snapshot":
+                book.load_snapshot(msg["bids"], msg["asks"], msg.get("seq"))
+                return True
+            if not book.synced:
+                # Waiting for the next snapshot after a gap.
+                return False
+            try:
+                book.apply_update(msg["bids"], msg["asks"], msg.get("seq"))
+                return True
+            except BookGapError as e:
+                self.gaps += 1
+                self.errors.append(f"[ERROR] {msg['exchange']} - {msg['symbol']} book: {e}")
+                return False
+
+    def metrics_frame(self, depth_bps=DEPTH_BPS, sizes=SLIPPAGE_SIZES):
+        rows = []
+        with self._lock:
+            for (ex_name, pair), book in sorted(self.books.items(), key=lambda kv: (kv[0][1], kv[0][0])):
+                if not book.synced:
+                    continue
+                row = {
+                    'Exchange': ex_name,
+                    'Pair': pair,
+                    'Best Bid': book.bids.best(),
+                    'Best Ask': book.asks.best(),
+                    'Mid': book.mid(),
+                }
+                for bps in depth_bps:
+                    bid_depth, ask_depth = book.depth(bps)
+                    row[f'Bid Depth {bps}bps'] = bid_depth
+                    row[f'Ask Depth {bps}bps'] = ask_depth
+                for size in sizes:
+                    buy, sell = book.slippage_bps(size)
+                    row[f'Buy {size:,} Slippage (bps)'] = buy
+                    row[f'Sell {size:,} Slippage (bps)'] = sell
+                row['Levels'] = len(book.bids) + len(book.asks)
+                row['Updated'] = pd.to_datetime(book.updated_at, unit='s')
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+
+def load_replay(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay_messages(manager, messages, speed=None):
+    # Applies recorded messages in order; with `speed` set, sleeps to keep the
+    # recorded pacing (speed=2 plays twice as fast).
+    started = time.monotonic()
+    first_t = messages[0]["t"] if messages else 0
+    for msg in messages:
+        if speed:
+            delay = (msg["t"] - first_t) / speed - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+        manager.apply_message(msg)
+
+
+class OrderBookCollector:
+    # Keeps `manager` current from ccxt.pro watch_order_book subscriptions, or
+    # from a recorded file when `replay_path` is set. Live books are turned into
+    # level changes before they reach the manager, and `record_path` saves
+    # those changes in the replay format.
+    def __init__(self, manager, exchange_names, coins, markets=None, replay_path=None, record_path=None):
+        self.manager = manager
+        self.exchange_names = list(exchange_names)
+        self.coins = list(coins)
+        self.markets = markets or {}
+        self.replay_path = replay_path
+        self.record_path = record_path
+        self._record_file = None
+        self._thread = threading.Thread(target=self._run, name="orderbook-stream", daemon=True)
+
+    def start(self):
+        if self.record_path:
+            self._record_file = open(self.record_path, "a", encoding="utf-8")
+        self._thread.start()
+        return self
+
+    def _run(self):
+        if self.replay_path:
+            replay_messages(self.manager, load_replay(self.replay_path), speed=1.0)
+        else:
+            asyncio.run(self._main())
+
+    async def _main(self):
+        async def watch_exchange(ex_name):
+            ex = getattr(ccxtpro, ex_name)()
+            try:
+                if self.markets.get(ex_name):
+                    ex.set_markets(self.markets[ex_name])
+                else:
+                    await ex.load_markets()
+                symbols = [coin for coin in self.coins if coin in ex.markets]
+                await asyncio.gather(*(self._watch_book(ex, ex_name, symbol) for symbol in symbols))
+            except Exception as e:
+                self.manager.errors.append(f"[ERROR] {ex_name} order books stopped: {e}")
+            finally:
+                await ex.close()
+
+        await asyncio.gather(*(watch_exchange(name) for name in self.exchange_names))
+
+    def _emit(self, msg):
+        self.manager.apply_message(msg)
+        if self._record_file:
+            self._record_file.write(json.dumps(msg) + "\n")
+            self._record_file.flush()
+
+    async def _watch_book(self, ex, ex_name, symbol):
+        delay = RECONNECT_DELAY_SEC
+        seq = None
+        while True:
+            try:
+                ob = await ex.watch_order_book(symbol, ORDERBOOK_LEVELS)
+            except Exception as e:
+                self.manager.errors.append(f"[ERROR] {ex_name} - {symbol} book stream: {e}")
+                seq = None
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY_SEC)
+                continue
+            delay = RECONNECT_DELAY_SEC
+            bids = ob["bids"][:ORDERBOOK_LEVELS]
+            asks = ob["asks"][:ORDERBOOK_LEVELS]
+            msg = {"exchange": ex_name, "symbol": symbol, "t": time.time()}
+            book = self.manager.book(ex_name, symbol)
+            if seq is None or not book.synced:
+                seq = 0
+                msg.update(type="snapshot", bids=[list(level[:2]) for level in bids],
+                           asks=[list(level[:2]) for level in asks], seq=seq)
+            else:
+                seq += 1
+                msg.update(type="update", bids=level_changes(book.bids, bids),
+                           asks=level_changes(book.asks, asks), seq=seq)
+            self._emit(msg)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded order-book updates and print depth/slippage metrics.")
+    parser.add_argument("replay", help="JSON-lines file in the replay format")
+    parser.add_argument("--speed", type=float, default=None, help="keep recorded pacing at this speed (default: as fast as possible)")
+    args = parser.parse_args()
+
+    manager = OrderBookManager()
+    messages = load_replay(args.replay)
+    started = time.perf_counter()
+    replay_messages(manager, messages, speed=args.speed)
+    elapsed = time.perf_counter() - started
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(manager.metrics_frame())
+    print(f"{len(messages)} messages in {elapsed:.3f}s, {manager.gaps} gaps")
+    for msg in manager.errors:
+        print(msg)
@@ -0,0 +1,68 @@
+"""Stand-in ticker WebSocket server for the dashboard's streaming mode.
+
+Replays a recording made with TICKER_RECORD_PATH (one JSON ticker per line)
+at its original pacing, so streaming mode and update-to-render latency can be
+exercised without network access:
+
+    python replay_server.py tickers.jsonl --port 8765 --speed 5 --loop
+    TICKER_REPLAY_URL=ws://127.0.0.1:8765/ws streamlit run broker_info.py
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from aiohttp import web
+
+
+def load_recording(path):
+    with open(path, encoding="utf-8") as f:
+        messages = [json.loads(line) for line in f if line.strip()]
+    messages.sort(key=lambda m: m["t"])
+    return messages
+
+
+async def replay(ws, messages, speed=1.0, loop=False):
+    while True:
+        first_t = messages[0]["t"]
+        started = time.monotonic()
+        for msg in messages:
+            due = (msg["t"] - first_t) / speed
+            delay = due - (time.monotonic() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            out = {"exchange": msg["exchange"], "symbol": msg["symbol"], "ticker": msg["ticker"], "sent_at": time.time()}
+            await ws.send_str(json.dumps(out))
+        if not loop:
+            return
+
+
+def make_app(messages, speed=1.0, loop=False):
+    async def handle(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        try:
+            await replay(ws, messages, speed, loop)
+        except ConnectionResetError:
+            pass
+        await ws.close()
+        return ws
+
+    app = web.Application()
+    app.router.add_get("/ws", handle)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded tickers over a local WebSocket.")
+    parser.add_argument("recording", help="JSON-lines file written via TICKER_RECORD_PATH")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--speed", type=float, default=1.0, help="playback speed multiplier")
+    parser.add_argument("--loop", action="store_true", help="restart the recording when it ends")
+    args = parser.parse_args()
+
+    recording = load_recording(args.recording)
+    if not recording:
+        raise SystemExit(f"{args.recording} has no recorded tickers")
+    web.run_app(make_app(recording, args.speed, args.loop), host=args.host, port=args.port)
@@ -0,0 +1,110 @@
+from array import array
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Snapshot column -> ccxt unified ticker key
+TICKER_FIELDS = {
+    'Price': 'last',
+    'Bid': 'bid',
+    'Ask': 'ask',
+    'High (24h)': 'high',
+    'Low (24h)': 'low',
+    'Volume (24h)': 'baseVolume',
+    'Quote Volume (24h)': 'quoteVolume',
+    '% Change': 'percentage',
+    'Change': 'change',
+    'Open': 'open',
+}
+UTC_OFFSET = pd.Timedelta(hours=3)
+NAN = float('nan')
+
+
+def _number(value):
+    if value is None:
+        return NAN
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return NAN
+
+
+class SnapshotBuilder:
+    # Accumulates tickers straight into typed float64 columns (no per-row
+    # dicts) and derives spread, mid, spread in bps, data age and the UTC+3
+    # timestamps in one vectorized pass in build().
+    def __init__(self):
+        self.exchanges = []
+        self.pairs = []
+        self.columns = {col: array('d') for col in TICKER_FIELDS}
+        self.timestamps = array('d')    # ms since epoch, NaN when the venue sent none
+        self.extra = {}
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def add(self, ex_name, pair, ticker, **extra):
+        n = len(self.pairs)
+        self.exchanges.append(ex_name)
+        self.pairs.append(pair)
+        for col, key in TICKER_FIELDS.items():
+            self.columns[col].append(_number(ticker.get(key)))
+        self.timestamps.append(_number(ticker.get('timestamp')))
+        # Optional per-row columns (e.g. Source); rows that lack one get None.
+        for col, value in extra.items():
+            self.extra.setdefault(col, [None] * n).append(value)
+        for col, values in self.extra.items():
+            if len(values) == n:
+                values.append(None)
+
+    def build(self, now=None):
+        now = datetime.utcnow() if now is None else now
+        data = {
+            'Exchange': pd.Categorical(self.exchanges),
+            'Pair': pd.Categorical(self.pairs),
+        }
+        for col, values in self.columns.items():
+            data[col] = np.frombuffer(values, dtype=np.float64).copy()
+        df = pd.DataFrame(data)
+
+        stamps = np.frombuffer(self.timestamps, dtype=np.float64)
+        valid = ~np.isnan(stamps)
+        stamps_ms = np.where(valid, stamps, 0).astype(np.int64).astype('datetime64[ms]')
+        stamps_ms[~valid] = np.datetime64('NaT')
+        df['Timestamp'] = pd.to_datetime(stamps_ms)
+        df['Timestamp (UTC+3)'] = df['Timestamp'] + UTC_OFFSET
+
+        bid = df['Bid'].to_numpy()
+        ask = df['Ask'].to_numpy()
+        spread = ask - bid
+        mid = (ask + bid) / 2
+        df['Spread'] = spread
+        df['Mid'] = mid
+        with np.errstate(divide='ignore', invalid='ignore'):
+            df['Spread (bps)'] = np.where(mid > 0, spread / mid * 1e4, np.nan)
+        df['Data Age (sec)'] = (pd.Timestamp(now) - df['Timestamp']).dt.total_seconds().round()
+
+        for col, values in self.extra.items():
+            df[col] = values
+        return df
+
+
+def build_snapshot(tickers, exchanges, coins, now=None, stale=None, symbols=None):
+    # `tickers` maps (exchange, pair) -> ccxt ticker; rows come out pair-major
+    # in `coins` order, then in `exchanges` order. With `stale` (a set of keys)
+    # the snapshot gains a boolean Stale column, and with a SymbolIndex a
+    # Symbol column holding each exchange's own symbol for the pair.
+    builder = SnapshotBuilder()
+    for coin in coins:
+        for ex_name in exchanges:
+            ticker = tickers.get((ex_name, coin))
+            if ticker is None:
+                continue
+            extra = {}
+            if symbols is not None:
+                extra['Symbol'] = symbols.symbol(ex_name, coin)
+            if stale is not None:
+                extra['Stale'] = (ex_name, coin) in stale
+            builder.add(ex_name, coin, ticker, **extra)
+    return builder.build(now)
@@ -0,0 +1,143 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+import aiohttp
+import ccxt.pro as ccxtpro
+
+RECONNECT_DELAY_SEC = 1
+MAX_RECONNECT_DELAY_SEC = 30
+
+
+class TickerTable:
+    # Latest ticker per (exchange, pair). Written by the stream thread, read by
+    # the dashboard; every update bumps `version` so readers can skip redraws.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {}
+        self.version = 0
+
+    def update(self, ex_name, pair, ticker, source="stream", sent_at=None):
+        row = {
+            "ticker": ticker,
+            "source": source,
+            "received_at": time.time(),
+            "sent_at": sent_at,
+        }
+        with self._lock:
+            self._rows[(ex_name, pair)] = row
+            self.version += 1
+
+    def rows(self):
+        with self._lock:
+            return dict(self._rows), self.version
+
+    def stale_pairs(self, keys, max_age):
+        now = time.time()
+        with self._lock:
+            return [key for key in keys
+                    if key not in self._rows or now - self._rows[key]["received_at"] > max_age]
+
+
+class StreamingCollector:
+    # Runs an asyncio loop in a daemon thread that keeps `table` current, either
+    # from ccxt.pro ticker subscriptions or from a replay server (see
+    # replay_server.py) when `replay_url` is set. With `record_path` every
+    # received ticker is appended as a JSON line the replay server can serve.
+    def __init__(self, table, exchange_names, coins, markets=None, replay_url=None, record_path=None):
+        self.table = table
+        self.exchange_names = list(exchange_names)
+        self.coins = list(coins)
+        self.markets = markets or {}
+        self.replay_url = replay_url
+        self.record_path = record_path
+        self.errors = deque(maxlen=50)
+        self._record_file = None
+        self._thread = threading.Thread(target=self._run, name="ticker-stream", daemon=True)
+
+    def start(self):
+        if self.record_path:
+            self._record_file = open(self.record_path, "a", encoding="utf-8")
+        self._thread.start()
+        return self
+
+    def _run(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        if self.replay_url:
+            await self._follow_replay()
+        else:
+            await asyncio.gather(*(self._watch_exchange(name) for name in self.exchange_names))
+
+    def _publish(self, ex_name, ticker, source="stream", sent_at=None):
+        symbol = ticker.get("symbol")
+        if symbol not in self.coins:
+            return
+        self.table.update(ex_name, symbol, ticker, source=source, sent_at=sent_at)
+        if self._record_file:
+            line = {"exchange": ex_name, "symbol": symbol, "ticker": ticker, "t": time.time()}
+            self._record_file.write(json.dumps(line) + "\n")
+            self._record_file.flush()
+
+    async def _watch_exchange(self, ex_name):
+        ex = getattr(ccxtpro, ex_name)()
+        delay = RECONNECT_DELAY_SEC
+        try:
+            while not ex.markets:
+                try:
+                    if self.markets.get(ex_name):
+                        # Reuse the markets the REST instance already loaded.
+                        ex.set_markets(self.markets[ex_name])
+                    else:
+                        await ex.load_markets()
+                except Exception as e:
+                    self.errors.append(f"[ERROR] {ex_name} stream markets: {e}")
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, MAX_RECONNECT_DELAY_SEC)
+            symbols = [coin for coin in self.coins if coin in ex.markets]
+            if ex.has.get("watchTickers"):
+                await self._watch_loop(ex_name, lambda: ex.watch_tickers(symbols), many=True)
+            else:
+                await asyncio.gather(*(
+                    self._watch_loop(ex_name, lambda symbol=symbol: ex.watch_ticker(symbol))
+                    for symbol in symbols
+                ))
+        except Exception as e:
+            self.errors.append(f"[ERROR] {ex_name} stream stopped: {e}")
+        finally:
+            await ex.close()
+
+    async def _watch_loop(self, ex_name, watch, many=False):
+        delay = RECONNECT_DELAY_SEC
+        while True:
+            try:
+                result = await watch()
+            except Exception as e:
+                self.errors.append(f"[ERROR] {ex_name} stream: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY_SEC)
+                continue
+            delay = RECONNECT_DELAY_SEC
+            for ticker in (result.values() if many else [result]):
+                self._publish(ex_name, ticker)
+
+    async def _follow_replay(self):
+        delay = RECONNECT_DELAY_SEC
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(self.replay_url) as ws:
+                        delay = RECONNECT_DELAY_SEC
+                        async for msg in ws:
+                            if msg.type != aiohttp.WSMsgType.TEXT:
+                                break
+                            data = json.loads(msg.data)
+                            ticker = dict(data["ticker"], symbol=data["symbol"])
+                            self._publish(data["exchange"], ticker, source="replay", sent_at=data.get("sent_at"))
+            except Exception as e:
+                self.errors.append(f"[ERROR] replay stream {self.replay_url}: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY_SEC)
@@ -0,0 +1,68 @@
+import os
+
+QUOTE_PREFERENCE = ('USDT', 'USD', 'USDC')   # per asset, the first quote an exchange lists is used
+CANONICAL_QUOTE = 'USD'                      # canonical pairs read BASE/USD whatever the venue quotes in
+TOP_N_PAIRS = int(os.getenv("TOP_N_PAIRS", "10"))
+
+
+def canonical_pair(base):
+    return f"{base}/{CANONICAL_QUOTE}"
+
+
+def is_candidate(market, quotes=QUOTE_PREFERENCE):
+    if market.get('active') is False:
+        return False
+    if market.get('spot') is False or market.get('type', 'spot') != 'spot':
+        return False
+    return market.get('quote') in quotes and market.get('base') not in quotes
+
+
+class SymbolIndex:
+    # Maps canonical pairs (BTC/USD) to the symbol each exchange actually
+    # trades (BTC/USDT on binance, BTC/USD on kraken) from the loaded markets,
+    # and ranks them by combined quote volume. Built once per markets refresh;
+    # every lookup during collection is a dict access.
+    def __init__(self, exchanges, volumes=None, top_n=TOP_N_PAIRS, quotes=QUOTE_PREFERENCE, pinned=()):
+        self.top_n = top_n
+        self.quotes = quotes
+        self.symbols = {}        # exchange -> {canonical pair: exchange symbol}
+        self.quote = {}          # (exchange, canonical pair) -> quote currency
+        self.markets_ids = {ex_name: id(ex.markets) for ex_name, ex in exchanges.items()}
+        rank = {quote: i for i, quote in enumerate(quotes)}
+        for ex_name, ex in exchanges.items():
+            best = {}
+            for symbol, market in (ex.markets or {}).items():
+                if not is_candidate(market, quotes):
+                    continue
+                pair = canonical_pair(market['base'])
+                if pair not in best or rank[market['quote']] < rank[best[pair]['quote']]:
+                    best[pair] = market
+            self.symbols[ex_name] = {pair: market['symbol'] for pair, market in best.items()}
+            for pair, market in best.items():
+                self.quote[(ex_name, pair)] = market['quote']
+        self.pairs = self.rank(volumes or {}, pinned)[:top_n]
+
+    def rank(self, volumes, pinned=()):
+        # Pinned pairs first, then by quote volume summed over exchanges (the
+        # quotes are all USD-like, so they add up), then by how many venues
+        # list the pair.
+        volume = {}
+        venues = {}
+        for ex_name, listed in self.symbols.items():
+            for pair, symbol in listed.items():
+                volume[pair] = volume.get(pair, 0.0) + (volumes.get((ex_name, symbol)) or 0.0)
+                venues[pair] = venues.get(pair, 0) + 1
+        pinned = [pair for pair in pinned if pair in venues]
+        others = sorted((pair for pair in venues if pair not in pinned),
+                        key=lambda pair: (-volume[pair], -venues[pair], pair))
+        return pinned + others
+
+    def symbol(self, ex_name, pair):
+        return self.symbols.get(ex_name, {}).get(pair)
+
+    def outdated(self, exchanges):
+        # ccxt replaces an exchange's markets dict on every (re)load.
+        return {ex_name: id(ex.markets) for ex_name, ex in exchanges.items()} != self.markets_ids
+
+    def __len__(self):
+        return len(self.pairs)
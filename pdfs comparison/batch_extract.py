@@ -0,0 +1,267 @@
+"""Headless batch extraction of certificate fields from a directory of PDFs.
+
+Every PDF is extracted locally (OCR cached per page) and the declared fields
+are read from its composition tables and labelled values. Only the fields
+still missing go to Gemini, under a requests-per-minute limit. One row per
+document is written to a CSV or XLSX table, and throughput and per-document
+cost are reported:
+
+    python batch_extract.py certificates/ --out results.xlsx --fields C Cu Co
+    python batch_extract.py certificates/ --schema fields.json --workers 8 --rpm 15
+
+A schema file lists the fields, e.g.
+[{"name": "C%", "symbol": "C", "min": 0, "max": 2.5}, {"name": "Cu%", "symbol": "Cu"}]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from gemini_files import DocumentRegistry, GeminiClient
+from local_ocr import OCR_WORKERS, DocumentExtractor, format_page
+from page_index import MAX_PAGE_CHARS, PageIndex, header_fields
+
+DEFAULT_FIELDS = ("C", "Cu", "Co")      # the question.txt case: percentages by element symbol
+# Plausible upper bounds (%) on steel certificates: above 2.5% C is cast iron,
+# and Cu and Co are residuals or alloying additions of a few percent. Values
+# outside a field's range are not taken as that field.
+DEFAULT_MAX_PERCENT = {"C": 2.5, "Cu": 5.0, "Co": 20.0}
+BATCH_WORKERS = 4                       # documents in flight at once; their pages share the OCR pool
+MODEL_RPM = 15                          # model requests per minute across all workers
+FALLBACK_PAGES = 3                      # most relevant pages sent when asking the model
+INPUT_USD_PER_MILLION = 0.075           # gemini-1.5-flash list price, prompts up to 128k tokens
+OUTPUT_USD_PER_MILLION = 0.30
+
+VALUE = re.compile(r"(?<![\w.,])(<\s*)?(\d+(?:[.,]\d+)?|[.,]\d+)(?!\w)")
+
+
+def load_schema(path=None, symbols=DEFAULT_FIELDS):
+    if path:
+        with open(path) as f:
+            fields = json.load(f)
+    else:
+        fields = [{"symbol": symbol, "max": DEFAULT_MAX_PERCENT.get(symbol, 100.0)} for symbol in symbols]
+    return [{"name": f.get("name", f"{f['symbol']}%"), "symbol": f["symbol"],
+             "min": float(f.get("min", 0.0)), "max": float(f.get("max", 100.0))} for f in fields]
+
+
+def parse_value(match, field):
+    # "0,12" -> 0.12; "< 0.005" stays text so detection limits are not read as measurements.
+    below, number = match
+    value = float(number.replace(",", "."))
+    if not field["min"] <= value <= field["max"]:
+        return None
+    return f"<{value:g}" if below else value
+
+
+def table_values(text):
+    # Composition tables: a row of element symbols, with the values on one of
+    # the next rows in the same column order. Extra leading numbers (heat or
+    # sample numbers) are dropped by aligning from the right.
+    found = {}
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        symbols = header_fields(line)
+        if not symbols:
+            continue
+        for row in lines[i + 1:i + 4]:
+            values = VALUE.findall(row)
+            if len(values) >= len(symbols):
+                for symbol, value in zip(symbols, values[len(values) - len(symbols):]):
+                    found.setdefault(symbol, value)
+                break
+    return found
+
+
+def labelled_value(text, field, in_table=False):
+    # "Cu% 0.30", "Cu (%): 0,30", "Cu = 0.30", but not "Co" for "C". Outside a
+    # table or box the symbol needs a % marker or a ":"/"=" after it, so prose
+    # such as "Grade C 45" or "Cu 2 pcs" is not read as a value; inside one,
+    # "Cu 0.30" is enough.
+    marker = r"(?:(?:%|\(%\)|\[%\])\s*[:=]?|[:=])"
+    if in_table:
+        marker += "?"
+    pattern = rf"(?<![A-Za-z]){re.escape(field['symbol'])}(?![a-z])\s*{marker}\s*"
+    for match in re.finditer(pattern, text):
+        value = VALUE.match(text, match.end())
+        if value and parse_value(value.groups(), field) is not None:
+            return value.groups()
+    return None
+
+
+def parse_fields(pages, fields):
+    # Tables first (they are what certificates use for composition), then
+    # labelled values, page by page. Returns {field name: (value, source)}.
+    texts = ["\n".join([page["text"]] + [region.get("text", "") for region in page["regions"]]) for page in pages]
+    labelled = []    # (text, inside a table or box)
+    for page in pages:
+        labelled.append((page["text"], False))
+        labelled += [(region.get("text", ""), True) for region in page["regions"]]
+    results = {}
+    for text in texts:
+        table = table_values(text)
+        for field in fields:
+            if field["name"] not in results and field["symbol"] in table:
+                value = parse_value(table[field["symbol"]], field)
+                if value is not None:
+                    results[field["name"]] = (value, "table")
+    for text, in_table in labelled:
+        for field in fields:
+            if field["name"] in results:
+                continue
+            match = labelled_value(text, field, in_table)
+            value = parse_value(match, field) if match else None
+            if value is not None:
+                results[field["name"]] = (value, "label")
+    return results
+
+
+class RateLimiter:
+    # Reserves the next request slot so concurrent workers stay spaced by
+    # 60/rpm seconds, like the collector's per-exchange limiter.
+    def __init__(self, per_minute):
+        self.interval = 60 / per_minute if per_minute else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def ask_model(registry, limiter, name, pages, fields, usage):
+    # Only the unresolved fields, only the pages most likely to hold them.
+    index = PageIndex()
+    index.add(name, pages)
+    hits = index.search(" ".join(f"{field['symbol']}%" for field in fields), k=FALLBACK_PAGES)
+    extracted = "\n\n".join(format_page(page)[:MAX_PAGE_CHARS] for _, _, page in hits)
+    attachments = [(f"Page {page['page']}:", page["pdf"]) for _, _, page in hits if page.get("pdf")]
+    names = ", ".join(field["name"] for field in fields)
+    prompt = f"""
+    This is a scanned test certificate. Extract these values: {names}.
+    Use the locally extracted text below and any attached page images.
+    Reply with one JSON object mapping each name to its numeric value as printed
+    (use null when it is not in the document), with no other text.
+
+    {extracted}
+    """
+    limiter.wait()
+    usage["model_calls"] = usage.get("model_calls", 0) + 1
+    reply = registry.generate(attachments, prompt, temperature=0.0, max_output_tokens=256,
+                              response_mime_type="application/json", usage=usage)
+    reply = reply.strip().removeprefix("```json").removeprefix("```").removesuffix("```")
+    try:
+        answers = json.loads(reply)
+    except ValueError:
+        return {}
+    return answers if isinstance(answers, dict) else {}
+
+
+def process_document(path, extractor, registry, limiter, fields):
+    started = time.perf_counter()
+    row = {"file": os.path.basename(path)}
+    usage = {}
+    results = {}
+    pages = []
+    try:
+        with open(path, "rb") as f:
+            pages = extractor.extract([f.read()])[0]
+        results = parse_fields(pages, fields)
+        missing = [field for field in fields if field["name"] not in results]
+        if missing and registry is not None:
+            answers = ask_model(registry, limiter, row["file"], pages, missing, usage)
+            for field in missing:
+                match = VALUE.match(str(answers.get(field["name"]) or ""))
+                value = parse_value(match.groups(), field) if match else None
+                if value is not None:
+                    results[field["name"]] = (value, "model")
+    except Exception as e:
+        row["error"] = str(e)
+    for field in fields:
+        value, source = results.get(field["name"], (None, "missing"))
+        row[field["name"]] = value
+        row[f"{field['name']} source"] = source
+    row.update({
+        "pages": len(pages),
+        "ocr pages": sum(1 for page in pages if page["source"] == "ocr" and not page["cached"]),
+        "model calls": usage.get("model_calls", 0),
+        "input tokens": usage.get("input_tokens", 0),
+        "output tokens": usage.get("output_tokens", 0),
+        "cost (USD)": round((usage.get("input_tokens", 0) * INPUT_USD_PER_MILLION
+                             + usage.get("output_tokens", 0) * OUTPUT_USD_PER_MILLION) / 1e6, 7),
+        "seconds": round(time.perf_counter() - started, 2),
+    })
+    row.setdefault("error", "")
+    return row
+
+
+def find_pdfs(directory):
+    paths = []
+    for root, _, names in os.walk(directory):
+        paths += [os.path.join(root, name) for name in names if name.lower().endswith(".pdf")]
+    return sorted(paths)
+
+
+def run_batch(args):
+    fields = load_schema(args.schema, args.fields)
+    paths = find_pdfs(args.input_dir)
+    if not paths:
+        sys.exit(f"no PDFs under {args.input_dir}")
+    extractor = DocumentExtractor(workers=args.ocr_workers)
+    registry = None
+    if not args.no_model:
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            sys.exit("GEMINI_API_KEY not set (or pass --no-model to use the local parser only)")
+        registry = DocumentRegistry(GeminiClient(api_key))
+    limiter = RateLimiter(args.rpm)
+
+    started = time.perf_counter()
+    rows = []
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = [pool.submit(process_document, path, extractor, registry, limiter, fields) for path in paths]
+        for done, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            rows.append(row)
+            status = row["error"] or ", ".join(f"{field['name']}={row[field['name']]}" for field in fields)
+            print(f"[{done}/{len(paths)}] {row['file']} {row['seconds']:.1f}s {status}", file=sys.stderr)
+    elapsed = time.perf_counter() - started
+
+    df = pd.DataFrame(rows).sort_values("file")
+    if args.out.lower().endswith(".xlsx"):
+        df.to_excel(args.out, index=False)
+    else:
+        df.to_csv(args.out, index=False)
+
+    sources = pd.concat([df[f"{field['name']} source"] for field in fields]).value_counts()
+    cost = df["cost (USD)"].sum()
+    print(f"{len(df)} documents, {df['pages'].sum()} pages ({df['ocr pages'].sum()} OCR'd) in {elapsed:.1f}s: "
+          f"{len(df) / elapsed * 60:.1f} documents/min, {df['pages'].sum() / elapsed:.1f} pages/s")
+    print("fields: " + ", ".join(f"{n} {source}" for source, n in sources.items())
+          + f"; {(df['error'] != '').sum()} documents failed")
+    print(f"model: {df['model calls'].sum()} calls, {df['input tokens'].sum()} input + "
+          f"{df['output tokens'].sum()} output tokens, ${cost:.4f} total, ${cost / len(df):.5f} per document")
+    print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract certificate fields from every PDF in a directory.")
+    parser.add_argument("input_dir")
+    parser.add_argument("--out", default="certificates.csv", help="output table, .csv or .xlsx")
+    parser.add_argument("--fields", nargs="+", default=list(DEFAULT_FIELDS), help="element symbols to extract as %%")
+    parser.add_argument("--schema", help="JSON list of fields instead of --fields")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    parser.add_argument("--ocr-workers", type=int, default=OCR_WORKERS, help="OCR processes (env OCR_WORKERS)")
+    parser.add_argument("--rpm", type=float, default=MODEL_RPM, help="model requests per minute")
+    parser.add_argument("--no-model", action="store_true", help="local parser only, unresolved fields stay empty")
+    run_batch(parser.parse_args())
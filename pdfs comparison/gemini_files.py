@@ -0,0 +1,244 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+GEMINI_API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")  # or gemini_stub_server.py
+MODEL = "gemini-1.5-flash"
+REQUEST_TIMEOUT = (3.05, 120)     # (connect, read) seconds for metadata and generation calls
+UPLOAD_TIMEOUT = (3.05, 300)      # uploads of large scans get longer to finish
+FILE_READY_TIMEOUT_SEC = 60       # how long an upload may stay PROCESSING before we give up
+FILE_READY_POLL_SEC = 0.5
+EXPIRY_MARGIN_SEC = 15 * 60       # handles this close to expiry are uploaded again instead of reused
+REGISTRY_PATH = os.getenv(
+    "PDF_REGISTRY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".gemini_files.sqlite3"))
+
+
+class GeminiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+
+
+def parse_timestamp(value):
+    # RFC 3339 with up to nanosecond precision, e.g. 2024-05-01T10:00:00.123456789Z.
+    if not value:
+        return 0.0
+    value = value.replace("Z", "+00:00")
+    if "." in value:
+        head, tail = value.split(".", 1)
+        digits = tail[:len(tail) - len(tail.lstrip("0123456789"))]
+        value = f"{head}.{digits[:6]}{tail[len(digits):]}"
+    return datetime.fromisoformat(value).timestamp()
+
+
+def content_name(digest):
+    # Remote file ids may be at most 40 lowercase alphanumerics, so the same
+    # bytes always map to the same files/<id> for every session and process.
+    return f"files/{digest[:40]}"
+
+
+class GeminiClient:
+    # Minimal REST client for the Gemini File API and generateContent on one
+    # pooled session, so it can be pointed at a local fake endpoint.
+    def __init__(self, api_key, base_url=GEMINI_API_BASE, model=MODEL):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=8, max_retries=Retry(
+            total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=None)))
+        self.session.mount("http://", self.session.adapters["https://"])
+        self.bytes_sent = 0
+
+    def _request(self, method, url, timeout=REQUEST_TIMEOUT, **kwargs):
+        kwargs.setdefault("params", {})["key"] = self.api_key
+        response = self.session.request(method, url, timeout=timeout, **kwargs)
+        self.bytes_sent += len(response.request.body or b"")
+        if response.status_code >= 400:
+            try:
+                message = response.json()["error"]["message"]
+            except (ValueError, KeyError, TypeError):
+                message = response.text[:200]
+            raise GeminiError(response.status_code, message)
+        return response
+
+    def upload_file(self, data, mime_type, display_name=None, name=None):
+        # Resumable upload protocol: one call to open the session, one to send
+        # the bytes and finalize it.
+        file = {}
+        if name:
+            file["name"] = name
+        if display_name:
+            file["displayName"] = display_name
+        start = self._request("POST", f"{self.base_url}/upload/v1beta/files", json={"file": file}, headers={
+            "X-Goog-Upload-Protocol": "resumable",
+            "X-Goog-Upload-Command": "start",
+            "X-Goog-Upload-Header-Content-Length": str(len(data)),
+            "X-Goog-Upload-Header-Content-Type": mime_type,
+        })
+        upload_url = start.headers["X-Goog-Upload-URL"]
+        finish = self._request("POST", upload_url, data=data, timeout=UPLOAD_TIMEOUT, headers={
+            "Content-Type": mime_type,
+            "X-Goog-Upload-Offset": "0",
+            "X-Goog-Upload-Command": "upload, finalize",
+        })
+        return finish.json()["file"]
+
+    def get_file(self, name):
+        return self._request("GET", f"{self.base_url}/v1beta/{name}").json()
+
+    def wait_until_active(self, file):
+        deadline = time.monotonic() + FILE_READY_TIMEOUT_SEC
+        while file.get("state") == "PROCESSING":
+            if time.monotonic() > deadline:
+                raise GeminiError(504, f"{file['name']} still processing after {FILE_READY_TIMEOUT_SEC}s")
+            time.sleep(FILE_READY_POLL_SEC)
+            file = self.get_file(file["name"])
+        if file.get("state") == "FAILED":
+            raise GeminiError(500, f"{file['name']} failed processing")
+        return file
+
+    def generate_content(self, parts, temperature=0.1, max_output_tokens=2048, response_mime_type=None, usage=None):
+        # Token counts are added to `usage` (a dict) when one is given.
+        config = {"temperature": temperature, "maxOutputTokens": max_output_tokens}
+        if response_mime_type:
+            config["responseMimeType"] = response_mime_type
+        response = self._request("POST", f"{self.base_url}/v1beta/models/{self.model}:generateContent", json={
+            "contents": [{"role": "user", "parts": parts}],
+            "generationConfig": config,
+        })
+        if usage is not None:
+            metadata = response.json().get("usageMetadata", {})
+            usage["input_tokens"] = usage.get("input_tokens", 0) + metadata.get("promptTokenCount", 0)
+            usage["output_tokens"] = usage.get("output_tokens", 0) + metadata.get("candidatesTokenCount", 0)
+        candidates = response.json().get("candidates") or []
+        if not candidates:
+            raise GeminiError(500, "no candidates returned")
+        return "".join(part.get("text", "") for part in candidates[0].get("content", {}).get("parts", []))
+
+
+class DocumentRegistry:
+    # Content-addressed handles for uploaded documents: each file is hashed,
+    # uploaded once under a name derived from the hash, and the handle is
+    # reused by every later question, session and process until it nears
+    # expiry. The sqlite table remembers handles across restarts; the remote
+    # name lets a fresh registry pick up a file another process uploaded.
+    def __init__(self, client, path=REGISTRY_PATH, expiry_margin=EXPIRY_MARGIN_SEC):
+        self.client = client
+        self.expiry_margin = expiry_margin
+        self.uploads = 0
+        self.reuses = 0
+        self._lock = threading.Lock()
+        self._digest_locks = {}
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+        except sqlite3.Error:
+            self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "digest TEXT PRIMARY KEY, name TEXT NOT NULL, uri TEXT NOT NULL, mime_type TEXT NOT NULL, "
+            "size INTEGER NOT NULL, expires REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def _lookup(self, digest):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT name, uri, mime_type, size, expires FROM files WHERE digest = ?", (digest,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("name", "uri", "mime_type", "size", "expires"), row), digest=digest)
+
+    def _store(self, digest, file, mime_type, size):
+        handle = {
+            "digest": digest,
+            "name": file["name"],
+            "uri": file["uri"],
+            "mime_type": file.get("mimeType", mime_type),
+            "size": size,
+            "expires": parse_timestamp(file.get("expirationTime")),
+        }
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO files (digest, name, uri, mime_type, size, expires) VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, handle["name"], handle["uri"], handle["mime_type"], size, handle["expires"]),
+            )
+            self._db.commit()
+        return handle
+
+    def _fresh(self, expires):
+        return expires - time.time() > self.expiry_margin
+
+    def handle(self, data, mime_type="application/pdf", display_name=None):
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            digest_lock = self._digest_locks.setdefault(digest, threading.Lock())
+        # Concurrent requests for the same bytes wait for one upload.
+        with digest_lock:
+            handle = self._lookup(digest)
+            if handle is not None and self._fresh(handle["expires"]):
+                self.reuses += 1
+                return handle
+            name = content_name(digest)
+            try:
+                file = self.client.get_file(name)
+                if not self._fresh(parse_timestamp(file.get("expirationTime"))):
+                    file = None
+            except GeminiError:
+                file = None
+            if file is None:
+                try:
+                    file = self.client.upload_file(data, mime_type, display_name, name=name)
+                except GeminiError as e:
+                    if e.status != 409:
+                        raise
+                    # Someone else uploaded it between our check and our upload;
+                    # an expiring leftover has to be replaced under a new name.
+                    file = self.client.get_file(name)
+                    if not self._fresh(parse_timestamp(file.get("expirationTime"))):
+                        file = self.client.upload_file(data, mime_type, display_name)
+                self.uploads += 1
+            else:
+                self.reuses += 1
+            file = self.client.wait_until_active(file)
+            return self._store(digest, file, mime_type, len(data))
+
+    def forget(self, handles):
+        # Drops handles the model refused (expired or deleted remotely) so the
+        # next handle() uploads again.
+        with self._lock:
+            self._db.executemany("DELETE FROM files WHERE digest = ?", [(h["digest"],) for h in handles])
+            self._db.commit()
+
+    def generate(self, attachments, prompt, **kwargs):
+        # attachments are (label, bytes) pairs, each sent as its label followed
+        # by the file's handle. A handle can still be refused if the file
+        # expired or was deleted remotely; it is forgotten and the call made
+        # once more with fresh uploads.
+        for attempt in range(2):
+            handles = [self.handle(data) for _, data in attachments]
+            parts = []
+            for (label, _), handle in zip(attachments, handles):
+                parts += [{"text": label}, file_part(handle)]
+            parts.append({"text": prompt})
+            try:
+                return self.client.generate_content(parts, **kwargs)
+            except GeminiError as e:
+                if attempt or e.status not in (403, 404):
+                    raise
+                self.forget(handles)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+
+def file_part(handle):
+    return {"file_data": {"mime_type": handle["mime_type"], "file_uri": handle["uri"]}}
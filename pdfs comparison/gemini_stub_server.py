@@ -0,0 +1,186 @@
+"""Stand-in for the Gemini REST API (File API + generateContent) for exercising
+pdf_comp.py offline.
+
+Uploads go through the resumable protocol and are kept in memory for --ttl-sec;
+generateContent answers with a canned summary of the prompt and the documents
+it was given (in JSON mode, 0.1 for every "X%" field the prompt names), refusing expired or unknown file URIs with 403 like the real
+service. --mbps throttles request bodies so the cost of resending inline PDF
+bytes shows up in latency:
+
+    python gemini_stub_server.py --port 8901 --mbps 20
+    GEMINI_API_BASE=http://127.0.0.1:8901 GEMINI_API_KEY=x streamlit run pdf_comp.py
+"""
+import argparse
+import base64
+import itertools
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def timestamp(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def make_handler(args):
+    files = {}               # files/<id> -> metadata dict with a private "_expires" and "_size"
+    sessions = {}            # upload id -> pending file metadata
+    counter = itertools.count(1)
+    lock = threading.Lock()
+    stats = {"requests": 0, "bytes": 0, "uploads": 0}
+
+    def live(name):
+        with lock:
+            file = files.get(name)
+            if file is not None and file["_expires"] <= time.time():
+                del files[name]
+                file = None
+            return file
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def send_json(self, status, data, headers=()):
+            payload = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for key, value in headers:
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def send_error_json(self, status, message):
+            self.send_json(status, {"error": {"code": status, "message": message}})
+
+        def read_body(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with lock:
+                stats["requests"] += 1
+                stats["bytes"] += len(body)
+            if args.mbps:
+                time.sleep(len(body) * 8 / (args.mbps * 1e6))
+            return body
+
+        def public(self, file):
+            return {k: v for k, v in file.items() if not k.startswith("_")}
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == "/stats":
+                self.send_json(200, stats)
+                return
+            if not url.path.startswith("/v1beta/files/"):
+                self.send_error_json(404, "not found")
+                return
+            file = live(url.path[len("/v1beta/"):])
+            if file is None:
+                self.send_error_json(404, "File not found.")
+            else:
+                self.send_json(200, self.public(file))
+
+        def do_POST(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            body = self.read_body()
+            if "key" not in query:
+                self.send_error_json(403, "API key missing.")
+            elif url.path == "/upload/v1beta/files" and "upload_id" not in query:
+                self.start_upload(body)
+            elif url.path == "/upload/v1beta/files":
+                self.finish_upload(query["upload_id"][0], body)
+            elif url.path.startswith("/v1beta/models/") and url.path.endswith(":generateContent"):
+                self.generate(json.loads(body or b"{}"))
+            else:
+                self.send_error_json(404, "not found")
+
+        def start_upload(self, body):
+            file = json.loads(body or b"{}").get("file", {})
+            name = file.get("name") or f"files/{uuid.uuid4().hex[:12]}"
+            if live(name) is not None:
+                self.send_error_json(409, f"File {name} already exists.")
+                return
+            upload_id = str(next(counter))
+            with lock:
+                sessions[upload_id] = {
+                    "name": name,
+                    "displayName": file.get("displayName", ""),
+                    "mimeType": self.headers.get("X-Goog-Upload-Header-Content-Type", "application/octet-stream"),
+                }
+            host = self.headers.get("Host")
+            self.send_json(200, {}, [("X-Goog-Upload-URL", f"http://{host}/upload/v1beta/files?upload_id={upload_id}")])
+
+        def finish_upload(self, upload_id, body):
+            with lock:
+                pending = sessions.pop(upload_id, None)
+            if pending is None:
+                self.send_error_json(404, "Upload session not found.")
+                return
+            now = time.time()
+            file = dict(pending, **{
+                "sizeBytes": str(len(body)),
+                "createTime": timestamp(now),
+                "expirationTime": timestamp(now + args.ttl_sec),
+                "uri": f"http://{self.headers.get('Host')}/v1beta/{pending['name']}",
+                "state": "ACTIVE",
+                "_expires": now + args.ttl_sec,
+                "_size": len(body),
+            })
+            with lock:
+                files[file["name"]] = file
+                stats["uploads"] += 1
+            self.send_json(200, {"file": self.public(file)})
+
+        def generate(self, body):
+            documents = []
+            prompt = ""
+            for part in body.get("contents", [{}])[-1].get("parts", []):
+                if "file_data" in part:
+                    uri = part["file_data"]["file_uri"]
+                    file = live("files/" + uri.rsplit("/files/", 1)[-1])
+                    if file is None:
+                        self.send_error_json(
+                            403, f"You do not have permission to access the File {uri} or it may not exist.")
+                        return
+                    documents.append(file["_size"])
+                elif "inline_data" in part:
+                    documents.append(len(base64.b64decode(part["inline_data"]["data"])))
+                else:
+                    prompt += part.get("text", "")
+            time.sleep(args.generate_ms / 1000)
+            question = next((line.strip() for line in prompt.splitlines() if "question:" in line.lower()), "")
+            text = "\n".join([f"Document {i + 1}: {size} bytes received" for i, size in enumerate(documents)]
+                             + [f"Answer to: {question}"])
+            if body.get("generationConfig", {}).get("responseMimeType") == "application/json":
+                text = json.dumps({name: 0.1 for name in re.findall(r"\b[A-Z][a-z]?%", prompt.split("\n\n")[0])})
+            self.send_json(200, {
+                "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+                "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4},
+            })
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Gemini File API and generateContent endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--ttl-sec", type=float, default=48 * 3600, help="lifetime of uploaded files")
+    parser.add_argument("--generate-ms", type=float, default=300, help="model latency per generateContent call")
+    parser.add_argument("--mbps", type=float, default=0, help="throttle request bodies to this many megabits/s")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(args))
+    print(f"serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,275 @@
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pytesseract
+from pdf2image import convert_from_bytes
+from pypdf import PdfReader, PdfWriter
+
+OCR_DPI = 200                   # rasterization resolution; enough for small print on certificates
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+OCR_WORKERS = max(1, int(os.getenv("OCR_WORKERS", "2")))  # OCR processes; os.cpu_count() sees the host, not the container
+MIN_TEXT_LAYER_CHARS = 200      # pages with at least this much embedded text are not OCR'd
+LOW_CONFIDENCE = 60             # mean word confidence (0-100) below which the page image is sent as well
+MIN_OCR_CHARS = 20              # pages yielding less text than this are probably pictures; send the image
+MIN_RULE_INCHES = 1.0           # horizontal ink runs at least this long are ruled lines...
+MIN_SIDE_INCHES = 0.25          # ...vertical ones need less, box sides are short; letters are shorter still
+DARK_LEVEL = 128                # grayscale level below which a pixel counts as ink
+EXTRACTOR_VERSION = 1           # bump when extraction output changes so cached pages are redone
+OCR_CACHE_PATH = os.getenv(
+    "OCR_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ocr_cache.sqlite3"))
+
+
+def page_digest(page):
+    # Hash of what the page draws: its content stream, the still-encoded bytes
+    # of the images it places, and its geometry. Cheap compared to rendering,
+    # and the same scan gets the same digest whichever file it arrives in.
+    h = hashlib.sha256()
+    contents = page.get_contents()
+    h.update(contents.get_data() if contents is not None else b"")
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources is not None else None
+    if xobjects is not None:
+        xobjects = xobjects.get_object()
+        for name in sorted(xobjects):
+            h.update(name.encode())
+            h.update(getattr(xobjects[name].get_object(), "_data", b""))
+    h.update(f"{list(page.mediabox)}:{page.get('/Rotate', 0)}".encode())
+    return h.hexdigest()
+
+
+def page_pdf(reader, index):
+    writer = PdfWriter()
+    writer.add_page(reader.pages[index])
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def line_mask(ink, min_length):
+    # Pixels lying on a horizontal run of ink at least min_length long.
+    if min_length < 2 or ink.shape[1] < min_length:
+        return np.zeros_like(ink)
+    cs = np.cumsum(np.pad(ink, ((0, 0), (1, 0))), axis=1, dtype=np.int32)
+    starts = (cs[:, min_length:] - cs[:, :-min_length]) == min_length
+    # A pixel is on a line if some all-ink window covers it.
+    c = np.cumsum(np.pad(starts, ((0, 0), (0, min_length - 1))), axis=1, dtype=np.int32)
+    covered = c.copy()
+    covered[:, min_length:] = c[:, min_length:] - c[:, :-min_length]
+    return covered > 0
+
+
+def spans(flags, min_gap=3):
+    # (start, end) of the runs of True in a 1-d array, merging gaps shorter than min_gap.
+    runs = []
+    for i in np.flatnonzero(flags):
+        if runs and i - runs[-1][1] <= min_gap:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+    return [(start, end) for start, end in runs]
+
+
+def detect_regions(image, dpi=OCR_DPI):
+    # Ruled tables and boxed fields: bands of the page bounded by long
+    # horizontal and vertical lines. A band with at least three lines each
+    # way has inner cells and is a table; otherwise it is a box.
+    ink = np.asarray(image.convert("L")) < DARK_LEVEL
+    height, width = ink.shape
+    horizontal = line_mask(ink, int(dpi * MIN_RULE_INCHES))
+    vertical = line_mask(ink.T, int(dpi * MIN_SIDE_INCHES)).T
+    rules = horizontal | vertical
+    regions = []
+    for top, bottom in spans(rules.any(axis=1), min_gap=height // 100 + 3):
+        for left, right in spans(rules[top:bottom + 1].any(axis=0), min_gap=width // 100 + 3):
+            rows = len(spans(horizontal[top:bottom + 1, left:right + 1].any(axis=1)))
+            cols = len(spans(vertical[top:bottom + 1, left:right + 1].any(axis=0)))
+            if rows < 2 or cols < 2:
+                continue
+            regions.append({
+                "kind": "table" if rows >= 3 and cols >= 3 else "box",
+                "bbox": [int(left), int(top), int(right), int(bottom)],
+            })
+    return regions
+
+
+def lines_from_data(data, min_conf=0):
+    # Rebuilds reading-order lines from pytesseract's word table.
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        conf = float(data["conf"][i])
+        if not word.strip() or conf < min_conf:
+            continue
+        confidences.append(conf)
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+    text = "\n".join(" ".join(words) for _, words in sorted(lines.items()))
+    return text, (sum(confidences) / len(confidences) if confidences else 0.0)
+
+
+def ocr_page(page_bytes, dpi=OCR_DPI, lang=OCR_LANG):
+    # Runs in a worker process: render one page, OCR it, find its tables and
+    # boxes and OCR each of those on its own so cell values stay together.
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")   # one core per worker; the pool provides the parallelism
+    image = convert_from_bytes(page_bytes, dpi=dpi)[0]
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+    text, confidence = lines_from_data(data)
+    regions = detect_regions(image, dpi)
+    for region in regions:
+        crop = image.crop(tuple(region["bbox"]))
+        region["text"] = pytesseract.image_to_string(crop, lang=lang, config="--psm 6").strip()
+    return {"source": "ocr", "text": text, "confidence": round(confidence, 1), "regions": regions}
+
+
+def needs_image(page):
+    if page["source"] == "text":
+        return False
+    return page["confidence"] < LOW_CONFIDENCE or len(page["text"].strip()) < MIN_OCR_CHARS
+
+
+class PageCache:
+    # digest -> extracted page, in sqlite so every session and restart shares it.
+    def __init__(self, path=OCR_CACHE_PATH):
+        self._lock = threading.Lock()
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+        except sqlite3.Error:
+            self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM pages WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, value):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO pages (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+            self._db.commit()
+
+
+class DocumentExtractor:
+    # Turns PDFs into per-page text before any question is asked. Pages with a
+    # usable text layer are read directly; the rest are OCR'd in a process
+    # pool, all documents' pages at once. Results are cached by page digest,
+    # so repeat questions and re-uploads skip OCR entirely.
+    def __init__(self, cache=None, workers=OCR_WORKERS, dpi=OCR_DPI):
+        self.cache = cache or PageCache()
+        self.workers = workers
+        self.dpi = dpi
+        self._pool = None
+        self._lock = threading.Lock()
+        self.stats = {"pages": 0, "cached": 0, "text_layer": 0, "ocr": 0, "failed": 0, "seconds": 0.0}
+
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _discard_pool(self, pool):
+        # A worker died (killed for memory while rasterizing, say) and took the
+        # pool with it: every later submit would fail, so the next pool() call
+        # starts a fresh one.
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, page_bytes):
+        # OCRs one page in the pool, rebuilding the pool once if it is broken.
+        # If that fails too, the returned future holds the error, so the page
+        # takes the same fallback as one whose OCR failed.
+        for _ in range(2):
+            pool = self.pool()
+            try:
+                return pool.submit(ocr_page, page_bytes, self.dpi)
+            except BrokenProcessPool as e:
+                self._discard_pool(pool)
+                error = e
+        future = Future()
+        future.set_exception(error)
+        return future
+
+    def extract(self, pdf_bytes_list):
+        # Returns one list of page dicts per document. Pages whose image should
+        # go to the model as well carry their single-page PDF under "pdf";
+        # "cached" tells whether the page came from the cache.
+        started = time.perf_counter()
+        documents = []
+        pending = []
+        for pdf_bytes in pdf_bytes_list:
+            try:
+                reader = PdfReader(io.BytesIO(pdf_bytes))
+                reader.pages[0]
+            except Exception as e:
+                # Unreadable here (encrypted, damaged): let the model read the whole file.
+                documents.append([{"source": "failed", "text": "", "confidence": 0.0, "regions": [],
+                                   "error": str(e), "page": 1, "cached": False, "pdf": pdf_bytes}])
+                self.stats["failed"] += 1
+                continue
+            pages = []
+            for index, page in enumerate(reader.pages):
+                key = f"{EXTRACTOR_VERSION}:{self.dpi}:{page_digest(page)}"
+                result = self.cache.get(key)
+                cached = result is not None
+                self.stats["pages"] += 1
+                if cached:
+                    self.stats["cached"] += 1
+                else:
+                    text = page.extract_text() or ""
+                    if len(text.strip()) >= MIN_TEXT_LAYER_CHARS:
+                        result = {"source": "text", "text": text.strip(), "confidence": 100.0, "regions": []}
+                        self.cache.put(key, result)
+                        self.stats["text_layer"] += 1
+                    else:
+                        pending.append((pages, index, key, reader, self.submit(page_pdf(reader, index))))
+                pages.append(dict(result or {}, page=index + 1, cached=cached))
+                if result is not None and needs_image(result):
+                    pages[-1]["pdf"] = page_pdf(reader, index)
+            documents.append(pages)
+
+        for pages, index, key, reader, future in pending:
+            try:
+                result = future.result()
+                self.cache.put(key, result)
+                self.stats["ocr"] += 1
+            except Exception as e:
+                # No OCR for this page (missing tesseract/poppler, corrupt page,
+                # a worker that died; the next submit() replaces that pool):
+                # the model gets the page itself instead. Not cached.
+                result = {"source": "failed", "text": "", "confidence": 0.0, "regions": [], "error": str(e)}
+                self.stats["failed"] += 1
+            pages[index] = dict(result, page=index + 1, cached=False)
+            if needs_image(result):
+                pages[index]["pdf"] = page_pdf(reader, index)
+        self.stats["seconds"] += time.perf_counter() - started
+        return documents
+
+
+def format_page(page, title=None):
+    # Compact text for the prompt: the page's text followed by its tables and
+    # boxes transcribed separately.
+    label = "embedded text" if page["source"] == "text" else f"OCR, confidence {page['confidence']:.0f}"
+    if page.get("pdf"):
+        label += "; page image attached"
+    lines = [f"--- {title or 'Page ' + str(page['page'])} ({label}) ---"]
+    if page["text"]:
+        lines.append(page["text"])
+    for i, region in enumerate(page["regions"], 1):
+        if region.get("text"):
+            lines.append(f"[{region['kind']} {i}]\n{region['text']}")
+    return "\n".join(lines)
+
+
+def format_document(pages, number):
+    return "\n".join([f"=== Document {number} ({len(pages)} pages) ==="] + [format_page(page) for page in pages])
@@ -0,0 +1,129 @@
+import math
+import re
+
+TOP_K_PAGES = 6             # pages sent to the model per question, unless more documents need one each
+MAX_PAGE_CHARS = 6000       # longer page texts are clipped in the prompt
+CONTEXT_CHAR_BUDGET = 80000 # extracted text sent per question (~20k tokens), whatever the number of pages
+PAGE_HEADER_CHARS = 120     # allowance for each page's title line and table/box labels
+FIELD_WEIGHT = 3            # a field in the question (C%, Cu%) counts as this many words
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+WORD = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+# A short symbol marked as a percentage (C%, Cu (%), Co [%]) or directly
+# followed by a decimal value (C 0.12, Cu: 0,30) is a field label.
+FIELD = re.compile(r"\b([A-Z][a-z]?)\s*(?:%|\(%\)|\[%\])")
+FIELD_VALUE = re.compile(r"\b([A-Z][a-z]?)\s*[:=]?\s*(?=\d*[.,]\d)")
+QUERY_FIELD = re.compile(r"\b([a-z]{1,2})\s*(?:%|\(%\)|\[%\])", re.IGNORECASE)
+SYMBOL = re.compile(r"^[A-Z][a-z]?$")
+STOPWORDS = frozenset(
+    "a an and are as at be by do does for from how in is it of on or the this these those to was were what "
+    "which with".split())
+
+
+def header_fields(line):
+    # Column headers of composition tables: a line made mostly of element-like
+    # symbols ("C Si Mn P S Cu Co" or "C% Si% Mn%") names a field per column.
+    tokens = [t.strip("%()[]:|") for t in line.split()]
+    symbols = [t for t in tokens if SYMBOL.match(t)]
+    if len(symbols) >= 3 and len(symbols) >= 0.6 * len(tokens):
+        return symbols
+    return []
+
+
+def page_tokens(text):
+    tokens = [w for w in WORD.findall(text.lower()) if w not in STOPWORDS]
+    fields = FIELD.findall(text) + FIELD_VALUE.findall(text)
+    for line in text.splitlines():
+        fields += header_fields(line)
+    return tokens + [f"field:{f.lower()}" for f in fields]
+
+
+def query_tokens(question):
+    fields = {f.lower() for f in QUERY_FIELD.findall(question)}
+    words = [w for w in WORD.findall(question.lower()) if w not in STOPWORDS and w not in fields]
+    return words + [f"field:{f}" for f in sorted(fields) for _ in range(FIELD_WEIGHT)]
+
+
+def page_text(page):
+    parts = [page["text"]] + [region.get("text", "") for region in page["regions"]]
+    return "\n".join(part for part in parts if part)
+
+
+def page_cost(page):
+    # Characters the page takes up in the prompt once clipped.
+    return min(len(page_text(page)), MAX_PAGE_CHARS) + PAGE_HEADER_CHARS
+
+
+class PageIndex:
+    # BM25 over the pages of every uploaded document (page text plus its
+    # transcribed tables and boxes), with field labels indexed as their own
+    # terms so "C%, Cu%, Co%" lands on the boxes and composition tables
+    # holding those values rather than on pages that merely say "percent".
+    def __init__(self):
+        self.documents = []     # (name, pages)
+        self.entries = []       # (document number, page, term counts, length)
+        self.df = {}
+        self.total_length = 0
+
+    def add(self, name, pages):
+        self.documents.append((name, pages))
+        number = len(self.documents)
+        for page in pages:
+            counts = {}
+            tokens = page_tokens(page_text(page))
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token in counts:
+                self.df[token] = self.df.get(token, 0) + 1
+            self.entries.append((number, page, counts, len(tokens)))
+            self.total_length += len(tokens)
+
+    def score(self, terms, counts, length):
+        n = len(self.entries)
+        average = self.total_length / n if n else 0.0
+        total = 0.0
+        for term in terms:
+            tf = counts.get(term, 0)
+            if not tf:
+                continue
+            idf = math.log(1 + (n - self.df[term] + 0.5) / (self.df[term] + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average) if average else BM25_K1
+            total += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return total
+
+    def search(self, question, k=TOP_K_PAGES, budget=CONTEXT_CHAR_BUDGET):
+        # Every document's best page first (its first page when nothing in it
+        # matches), best documents first, so comparisons see every document;
+        # then the best remaining matching pages, up to k pages in all. Pages
+        # are only taken while they fit in `budget` characters; documents left
+        # out that way are reported by omitted().
+        terms = query_tokens(question)
+        scored = sorted(((self.score(terms, counts, length), number, page)
+                         for number, page, counts, length in self.entries),
+                        key=lambda hit: (-hit[0], hit[1], hit[2]["page"]))
+        best = {}
+        for hit in scored:
+            best.setdefault(hit[1], hit)
+        chosen = []
+        used = 0
+        for hit in best.values():
+            if used + page_cost(hit[2]) <= budget:
+                chosen.append(hit)
+                used += page_cost(hit[2])
+        first = {id(hit) for hit in best.values()}
+        for hit in scored:
+            if len(chosen) >= k or hit[0] <= 0:
+                break
+            if id(hit) not in first and used + page_cost(hit[2]) <= budget:
+                chosen.append(hit)
+                used += page_cost(hit[2])
+        return sorted(chosen, key=lambda hit: (hit[1], hit[2]["page"]))
+
+    def omitted(self, hits):
+        # Names of the documents none of whose pages made it into `hits`.
+        included = {number for _, number, _ in hits}
+        return [name for number, (name, _) in enumerate(self.documents, 1) if number not in included]
+
+    def __len__(self):
+        return len(self.entries)
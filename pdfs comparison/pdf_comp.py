@@ -3,28 +3,62 @@ import streamlit as st
 import os
 import tempfile
 from typing import List
-import google.generativeai as genai
+from gemini_files import DocumentRegistry, GeminiClient
+from local_ocr import DocumentExtractor, format_page
+from page_index import MAX_PAGE_CHARS, PageIndex
 
-genai.configure(api_key=st.secrets.get("GEMINI_API_KEY") or os.getenv("GEMINI_API_KEY"))
-if not (st.secrets.get("GEMINI_API_KEY") or os.getenv("GEMINI_API_KEY")):
+GEMINI_API_KEY = st.secrets.get("GEMINI_API_KEY") or os.getenv("GEMINI_API_KEY")
+if not GEMINI_API_KEY:
     st.error("GEMINI_API_KEY not set.")
     st.stop()
 
-def generate_content_with_pdfs(pdf_bytes_list: List[bytes], user_q: str) -> str:
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    contents = []
-    
-    for i, pdf_bytes in enumerate(pdf_bytes_list):
-        contents.append({
-            "mime_type": "application/pdf",
-            "data": pdf_bytes
-        })
+@st.cache_resource
+def get_registry() -> DocumentRegistry:
+    # Shared by every session: a PDF is uploaded to Gemini's file store once and
+    # later questions only send its handle.
+    return DocumentRegistry(GeminiClient(GEMINI_API_KEY))
+
+@st.cache_resource
+def get_extractor() -> DocumentExtractor:
+    # One OCR process pool and page cache for the whole server.
+    return DocumentExtractor()
+
+def build_page_index(names: List[str], pdf_bytes_list: List[bytes]) -> PageIndex:
+    # Text is extracted locally (cached per page) and every page indexed once
+    # per upload; questions then only touch the pages they need.
+    index = PageIndex()
+    for name, pages in zip(names, get_extractor().extract(pdf_bytes_list)):
+        index.add(name, pages)
+    return index
+
+def generate_content_with_pdfs(index: PageIndex, user_q: str) -> str:
+    registry = get_registry()
+    # Each document's most relevant page goes out, plus the best other pages,
+    # within a fixed character budget; of those, only pages the OCR could not
+    # read reliably are sent as images. Documents that did not fit are named
+    # in the prompt and under the answer.
+    hits = index.search(user_q)
+    omitted = index.omitted(hits)
+    if omitted:
+        omitted_note = (f"These {len(omitted)} documents did not fit in this request and are NOT included: "
+                        f"{', '.join(omitted)}. Say in your answer that they were not examined.")
+    else:
+        omitted_note = "Every document is represented by at least its most relevant page."
+    extracted = "\n\n".join(
+        format_page(page, f"Document {number} ({index.documents[number - 1][0]}), page {page['page']}")[:MAX_PAGE_CHARS]
+        for _, number, page in hits)
+    image_pages = [(number, page) for _, number, page in hits if page.get("pdf")]
     
     enhanced_prompt = f"""
     You are analyzing scanned PDF documents that may contain tables, forms, or structured data.
+    Their text has already been extracted locally with OCR and is given below; ruled tables
+    and boxed fields are transcribed separately after each page. Page images are attached
+    only for pages whose OCR was unreliable, read those pages from the image. Only the
+    pages most relevant to the question are included, out of {len(index)} pages in
+    {len(index.documents)} documents. {omitted_note}
     
-    Please carefully examine ALL uploaded PDF documents and:
-    1. Use OCR to read any text, numbers, or values in the documents
+    Please carefully examine ALL documents and:
+    1. Use the extracted text and attached pages to read any text, numbers, or values
     2. Pay special attention to tables, boxes, fields, and structured layouts
     3. Look for percentages, chemical compositions, test results, or numerical data
     4. If you see boxes or fields with labels, extract both the label and the value
@@ -39,21 +73,21 @@ def generate_content_with_pdfs(pdf_bytes_list: List[bytes], user_q: str) -> str:
     - Any percentage values (like C%, Cu%, Co%)
     - Numerical data in tables or forms
     - Field labels and their corresponding values
-    """
     
-    contents.append(enhanced_prompt)
+    Extracted text of the relevant pages:
+    {extracted}
+    """
     
     try:
-        response = model.generate_content(
-            contents,
-            generation_config=genai.GenerationConfig(
-                temperature=0.1,
-                max_output_tokens=2048,
-            )
-        )
-        return response.text
+        answer = registry.generate(
+            [(f"Document {number}, page {page['page']}:", page["pdf"]) for number, page in image_pages],
+            enhanced_prompt, temperature=0.1, max_output_tokens=2048)
     except Exception as e:
-        return f"Error querying Gemini: {e}"
+        answer = f"Error querying Gemini: {e}"
+    if omitted:
+        answer += (f"\n\n⚠️ Not examined, over the per-question size limit ({len(omitted)} of "
+                   f"{len(index.documents)} documents): {', '.join(omitted)}. Ask about them separately.")
+    return answer
 
 def generate_comparison_prompt(user_question: str) -> str:
     """Generate a more specific prompt for comparing documents"""
@@ -77,9 +111,9 @@ def generate_comparison_prompt(user_question: str) -> str:
 st.title("📄🔍 Ask across Documents: make a conversation and ask questions related to the uploaded files")
 st.caption("Optimized for scanned documents, test reports, and certificates")
 
-with st.expander("Upload up to two PDFs", expanded=True):
-    pdf1 = st.file_uploader("First PDF", type="pdf", help="Upload scanned documents, test reports, or certificates")
-    pdf2 = st.file_uploader("Second PDF", type="pdf", help="Optional second document for comparison")
+with st.expander("Upload PDFs", expanded=True):
+    pdfs = st.file_uploader("PDFs", type="pdf", accept_multiple_files=True,
+                            help="Upload scanned documents, test reports, or certificates")
 
 # Example questions for guidance
 with st.expander("💡 Example Questions"):
@@ -101,29 +135,31 @@ ask_btn = st.button("🔍 Analyze Documents", type="primary")
 
 if "conversation_history" not in st.session_state:
     st.session_state.conversation_history: List[dict] = []
-if "uploaded_pdf_bytes" not in st.session_state:
-    st.session_state.uploaded_pdf_bytes: List[bytes] = []
+if "page_index" not in st.session_state:
+    st.session_state.page_index = None
 if "files_processed_for_gemini" not in st.session_state:
-    st.session_state.files_processed_for_gemini = False
+    st.session_state.files_processed_for_gemini = None
 
 if ask_btn and question:
-    uploads = [f for f in (pdf1, pdf2) if f]
+    uploads = list(pdfs or [])
     if not uploads:
         st.error("📋 Please upload at least one PDF before asking.")
         st.stop()
     
-    if not st.session_state.files_processed_for_gemini:
-        st.session_state.uploaded_pdf_bytes = []
-        for uploaded_file in uploads:
-            st.session_state.uploaded_pdf_bytes.append(uploaded_file.getvalue())
-        st.session_state.files_processed_for_gemini = True
+    # Re-index only when the set of uploaded files changes.
+    upload_key = tuple((f.name, f.size) for f in uploads)
+    if st.session_state.files_processed_for_gemini != upload_key:
+        with st.spinner(f"📑 Extracting text from {len(uploads)} document(s)..."):
+            st.session_state.page_index = build_page_index(
+                [f.name for f in uploads], [f.getvalue() for f in uploads])
+        st.session_state.files_processed_for_gemini = upload_key
         
-        st.success(f"✅ Processed {len(uploads)} document(s)")
+        st.success(f"✅ Processed {len(uploads)} document(s), {len(st.session_state.page_index)} pages")
     
     st.session_state.conversation_history.append({"role": "user", "content": question})
     
     with st.spinner("🔍 Analyzing documents with enhanced OCR..."):
-        answer = generate_content_with_pdfs(st.session_state.uploaded_pdf_bytes, question)
+        answer = generate_content_with_pdfs(st.session_state.page_index, question)
         st.session_state.conversation_history.append({"role": "assistant", "content": answer})
     
     st.chat_message("assistant").write(answer)
@@ -138,7 +174,7 @@ if st.session_state.conversation_history:
 
 if st.button("🔄 Reset Conversation"):
     st.session_state.conversation_history = []
-    st.session_state.uploaded_pdf_bytes = []
-    st.session_state.files_processed_for_gemini = False
+    st.session_state.page_index = None
+    st.session_state.files_processed_for_gemini = None
     st.rerun()
 
@@ -0,0 +1,48 @@
+import pytest
+
+from batch_extract import load_schema, parse_fields
+
+FIELDS = load_schema()
+
+
+def page(text, regions=()):
+    return {"text": text, "regions": [{"kind": "box", "text": region} for region in regions]}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("C% 0.12 Cu% 0.30 Co% 0.015", {"C%": 0.12, "Cu%": 0.30, "Co%": 0.015}),
+    ("Cu (%): 0,30", {"Cu%": 0.30}),
+    ("C = 0.21", {"C%": 0.21}),
+    ("Co [%] < 0.005", {"Co%": "<0.005"}),
+])
+def test_labelled_values(text, expected):
+    results = parse_fields([page(text)], FIELDS)
+    assert {name: value for name, (value, _) in results.items()} == expected
+    assert {source for _, source in results.values()} == {"label"}
+
+
+@pytest.mark.parametrize("text", [
+    "Grade C 45 steel",           # bare symbol followed by a number in running text
+    "Cu 2 pcs, Co 1 of 3",
+    "C 0.12",                     # plausible value, but no % marker, ":"/"=" or table
+    "C%: 45",                     # labelled, but no steel has 45% carbon
+    "Heat No. C 12345",
+    "Co: 3a",
+])
+def test_unlabelled_or_implausible_values_are_left_for_the_model(text):
+    assert parse_fields([page(text)], FIELDS) == {}
+
+
+def test_bare_symbol_inside_a_box_counts():
+    results = parse_fields([page("Grade C 45 steel", regions=["C 0.12 Cu 0.30"])], FIELDS)
+    assert results == {"C%": (0.12, "label"), "Cu%": (0.30, "label")}
+
+
+def test_out_of_range_label_does_not_hide_a_later_one():
+    assert parse_fields([page("C: 45 bars, C%: 0.18")], FIELDS) == {"C%": (0.18, "label")}
+
+
+def test_composition_table_aligned_from_the_right():
+    text = "Heat C Si Mn Cu Co\n24117 0.12 0.25 1.10 0.30 0.01"
+    results = parse_fields([page(text)], FIELDS)
+    assert results == {"C%": (0.12, "table"), "Cu%": (0.30, "table"), "Co%": (0.01, "table")}